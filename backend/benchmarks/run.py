@@ -0,0 +1,246 @@
+"""Benchmarks of the dispersion and vectorisation hot paths.
+
+    python benchmarks/run.py                       # full matrix, table on stdout
+    python benchmarks/run.py --output now.json     # also save the results
+    python benchmarks/run.py --compare base.json   # flag cases slower than the baseline
+
+Every case is timed over --repeat runs (the best run is reported), then run once more under
+tracemalloc to record the peak of traced allocations (NumPy buffers included).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_ROOT))
+
+# Конфигурация требует переменных окружения сервера, для бенчмарков они не используются
+for name, value in (("API_HOST", "localhost"), ("API_PORT", "5001"),
+                    ("API_OPENWEATHERMAP", ""), ("API_OPENWEATHERMAP_CITY", "")):
+    os.environ.setdefault(name, value)
+
+import numpy as np
+
+import src.config as cfg
+from src.gaussian_distribution import disperse
+from src.gaussian_distribution.rsdm import RSDM, HourMET, grid_quality
+from src.gaussian_distribution.visualise import generate_png
+from src.gaussian_distribution.process import GeoJSONApp, GeoJSONGenerator, WeatherChecker
+from src.api.model import prepare_model
+
+PGCATS = ("A", "B", "C", "D", "E", "F")
+QUALITIES = tuple(grid_quality)
+DOMAINS = (5000, 10000, 20000)
+POINTS = 10_000  # Число вызовов скалярных функций на замер
+
+# Одна и та же погода для всех классов устойчивости, класс задаётся отдельно
+WEATHER = {
+    'temperature': 5,
+    'temperature_min': 276.15,
+    'temperature_max': 280.15,
+    'humidity': 60,
+    'wind_direction': 250,
+    'wind_speed': 3,
+    'clouds': 80,
+    'weather_conditions': ['Clouds']
+}
+
+
+def stub_weather_checker(pgcat):
+    class StubWeatherChecker(WeatherChecker):
+        def fetch_weather(self):
+            self.weather_data = dict(WEATHER)
+
+        def check_conditions(self):
+            return pgcat
+
+    return StubWeatherChecker
+
+
+def build_model(pgcat, quality, domain, backend):
+    return RSDM(
+        WEATHER["wind_speed"], WEATHER["wind_direction"], WEATHER["temperature"], pgcat,
+        x_length=domain, y_length=domain, backend=backend, quality=quality,
+    )
+
+
+def measure(func, repeat):
+    func()  # Прогрев: JIT-компиляция, кэши
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return best, peak
+
+
+# Each case yields (name, params, func) for every combination it covers.
+
+def case_C(args):
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0.01, 20, POINTS)
+    y = rng.uniform(-500, 500, POINTS)
+    for pgcat in args.pgcats:
+        sigY, sigZ = disperse.SigmaY[pgcat], disperse.SigmaZ[pgcat]
+
+        def run():
+            for xi, yi in zip(x, y):
+                disperse.C(xi, yi, 0, 3.0, 3.86, 80, sigY, sigZ)
+
+        yield "C", {"pgcat": pgcat, "calls": POINTS}, run
+
+
+def case_plumeRise(args):
+    rng = np.random.default_rng(0)
+    us = rng.uniform(0.5, 15, POINTS)
+    for pgcat in args.pgcats:
+        def run():
+            for u in us:
+                disperse.plumeRise(u, 17.5, 2.5, 473.15, 278.15, pgcat)
+
+        yield "plumeRise", {"pgcat": pgcat, "calls": POINTS}, run
+
+
+def case_iter_disp(args):
+    for pgcat in args.pgcats:
+        for quality in args.qualities:
+            for domain in args.domains:
+                model = build_model(pgcat, quality, domain, args.backend)
+                met = [HourMET(1, model.wspd, model.wdir * np.pi / 180, pgcat)]
+
+                def run(model=model, met=met):
+                    model.rGrid.fill(0)
+                    disperse.iter_disp(model, met, model.ambient_temp)
+
+                params = {"pgcat": pgcat, "quality": quality, "domain": domain, "backend": args.backend}
+                yield "iter_disp", params, run
+
+
+# Cases on a finished grid use class D, which gives the widest band structure at these domains
+def model_grids(args):
+    for quality in args.qualities:
+        for domain in args.domains:
+            model = build_model("D", quality, domain, args.backend)
+            model.run_model()
+            yield quality, domain, model
+
+
+def case_generate_png(args):
+    for quality, domain, model in model_grids(args):
+        grid_max = model.grid_max(model.rGrid)
+        yield "generate_png", {"quality": quality, "domain": domain}, lambda: generate_png(model.rGrid, grid_max)
+
+
+def case_grid_max(args):
+    for quality, domain, model in model_grids(args):
+        yield "grid_max", {"quality": quality, "domain": domain}, lambda: model.grid_max(model.rGrid)
+
+
+def case_create_geojson(args):
+    for quality, domain, model in model_grids(args):
+        bands = model.update_image(rgba=False)
+
+        def run(bands=bands):
+            GeoJSONGenerator(bands, cell_size=model.grid).create_geojson_from_img_data(56.3287, 44.002)
+
+        yield "create_geojson_from_img_data", {"quality": quality, "domain": domain}, run
+
+
+def case_app_run(args):
+    cfg.GEOJSON_PATH = Path(tempfile.gettempdir()) / "emissioneye_bench_geo.json"
+    for mode in args.modes:
+        for pgcat in args.pgcats:
+            for quality in args.qualities:
+                for domain in args.domains:
+                    class BenchApp(GeoJSONApp):
+                        weather_checker_class = stub_weather_checker(pgcat)
+                        model_params = dict(GeoJSONApp.model_params, x_length=domain, y_length=domain, backend=args.backend)
+
+                    app = BenchApp(cfg.FACTORIES_PATH, mode=mode, prepare=prepare_model)
+                    params = {"mode": mode, "pgcat": pgcat, "quality": quality, "domain": domain}
+                    yield "GeoJSONApp.run", params, lambda app=app, quality=quality: app.run(quality)
+
+
+cases = {
+    "C": case_C,
+    "plumeRise": case_plumeRise,
+    "iter_disp": case_iter_disp,
+    "generate_png": case_generate_png,
+    "grid_max": case_grid_max,
+    "create_geojson": case_create_geojson,
+    "app_run": case_app_run,
+}
+
+
+def result_key(result):
+    return result["case"] + " " + " ".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=list(cases), default=list(cases))
+    parser.add_argument("--pgcats", nargs="+", choices=PGCATS, default=list(PGCATS))
+    parser.add_argument("--qualities", nargs="+", choices=QUALITIES, default=list(QUALITIES))
+    parser.add_argument("--domains", nargs="+", type=int, default=list(DOMAINS), help="domain side, m")
+    parser.add_argument("--modes", nargs="+", choices=GeoJSONApp.modes, default=list(GeoJSONApp.modes))
+    parser.add_argument("--backend", choices=list(disperse.dispersion_backends), default=cfg.MODEL_BACKEND)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="save results as JSON")
+    parser.add_argument("--compare", type=Path, help="baseline JSON from --output")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = {}
+    if args.compare is not None:
+        baseline = {result_key(r): r for r in json.loads(args.compare.read_text())["results"]}
+
+    results = []
+    regressions = 0
+    for case in args.cases:
+        for name, params, func in cases[case](args):
+            seconds, peak = measure(func, args.repeat)
+            result = {"case": name, "params": params, "seconds": seconds, "peak_bytes": peak}
+            results.append(result)
+
+            line = f"{result_key(result):<90} {seconds * 1000:>10.2f} ms {peak / 2 ** 20:>9.1f} MiB"
+            previous = baseline.get(result_key(result))
+            if previous is not None:
+                ratio = seconds / previous["seconds"]
+                line += f"  x{ratio:.2f}"
+                if ratio > args.threshold:
+                    line += "  REGRESSION"
+                    regressions += 1
+            print(line, flush=True)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps({
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "results": results,
+        }, indent=2))
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
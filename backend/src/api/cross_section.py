@@ -0,0 +1,30 @@
+from fastapi import Request, HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from .routers import unprotected
+from .payloads import Payload, version_cache
+
+import src.config as cfg
+from src import loader
+
+
+# Срезы сериализуются один раз и кэшируются по предприятию и азимуту (целые градусы)
+@version_cache(maxsize=cfg.CROSS_SECTION_CACHE_SIZE)
+def cached_section(factory, azimuth):
+    section = loader.gd.cross_section(factory, azimuth)
+    return None if section is None else Payload(section).precompress()
+
+
+@unprotected.post("/get_cross_section")
+async def get_cross_section(request: Request, factory: int, azimuth: float):
+    if not 0 <= factory < len(cfg.FACTORIES["features"]):
+        raise HTTPException(status_code=404, detail="Factory not found")
+    # Срез строится по одной метеостроке и не соответствует карте, усреднённой по ряду (MET_SERIES_PATH)
+    if loader.gd.met_series is not None:
+        raise HTTPException(status_code=409, detail="Cross sections are not available for a met series average")
+
+    section = await run_in_threadpool(cached_section, factory, round(azimuth) % 360)
+    if section is None:
+        raise HTTPException(status_code=503, detail="Model has not been run yet")
+
+    return section.response(request)
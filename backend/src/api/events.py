@@ -0,0 +1,81 @@
+import json
+import asyncio
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from .routers import unprotected
+from .payloads import payloads
+
+
+# Рассылка событий подписчикам Server-Sent Events. announce() можно вызывать из любого потока,
+# сообщение передаётся в цикл событий и раскладывается по очередям подписчиков
+class Broadcaster:
+    queue_size = 16
+
+    def __init__(self):
+        self.loop = None
+        self.subscribers = set()
+
+    def subscribe(self):
+        self.loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def announce(self, event, data):
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.deliver, format_event(event, data))
+
+    def deliver(self, message):
+        for queue in self.subscribers:
+            # Медленный клиент теряет самые старые события, а не задерживает остальных
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+broadcaster = Broadcaster()
+heartbeat_interval = 15  # с
+
+
+def model_event():
+    # Сведения о модели и размере geojson, по которым клиент решает, нужно ли скачивать данные
+    geojson = payloads["geojson"]
+    return {
+        **json.loads(payloads["model"].body),
+        "etag": geojson.etag,
+        "size": len(geojson.body),
+        "gzip_size": len(geojson.gzip),
+    }
+
+
+@unprotected.get("/events")
+async def get_events(request: Request):
+    queue = broadcaster.subscribe()
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            yield format_event("model", model_event())
+
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
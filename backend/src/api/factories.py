@@ -1,18 +1,17 @@
-import json
-import copy
+from typing import Optional
+
 from fastapi import Request
-from fastapi.responses import JSONResponse
 
 from .routers import unprotected
-
-import src.config as cfg
+from .payloads import Payload, payloads
+from .spatial import indexes, parse_bbox, select_points
 
 
-@unprotected.post("/get_factories")
-async def get_factories(request: Request):
-    factories = copy.deepcopy(cfg.FACTORIES)
-    
-    for factory in factories["features"]:
-        factory["geometry"]["coordinates"].reverse()
+# bbox=min_lon,min_lat,max_lon,max_lat - только предприятия внутри области
+@unprotected.api_route("/get_factories", methods=["GET", "POST"])
+async def get_factories(request: Request, bbox: Optional[str] = None):
+    if bbox is None:
+        return payloads["factories"].response(request)
 
-    return JSONResponse(json.dumps(factories))
+    features = select_points(indexes["factories"], parse_bbox(bbox))
+    return Payload(dict(type="FeatureCollection", features=features)).response(request)
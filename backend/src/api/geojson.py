@@ -1,12 +1,36 @@
-import json
-from fastapi import Request
-from fastapi.responses import JSONResponse
+from typing import Optional
+
+from fastapi import Query, Request
+from starlette.concurrency import run_in_threadpool
 
 from .routers import unprotected
+from .payloads import Payload, payloads
+from .spatial import indexes, parse_bbox
 
 import src.config as cfg
 
 
-@unprotected.post("/get_geojson")
-async def get_geojson(request: Request):
-    return JSONResponse(json.dumps(cfg.GEOJSON_DATA))
\ No newline at end of file
+def lod_name(zoom):
+    return f"geojson_z{zoom}"
+
+
+def geojson_name(zoom):
+    # Наименьший опубликованный уровень детализации, не грубее масштаба zoom;
+    # без zoom и на крупных масштабах - полный набор
+    if zoom is not None:
+        for level in sorted(cfg.GEOJSON_LOD_ZOOMS):
+            if zoom <= level and lod_name(level) in payloads:
+                return lod_name(level)
+    return "geojson"
+
+
+# zoom - масштаб карты, для которого достаточно упрощённого набора полигонов (см. GEOJSON_LOD_ZOOMS)
+# bbox=min_lon,min_lat,max_lon,max_lat - только полигоны, пересекающие область, обрезанные по ней
+@unprotected.api_route("/get_geojson", methods=["GET", "POST"])
+async def get_geojson(request: Request, bbox: Optional[str] = None, zoom: Optional[int] = Query(None, ge=0, le=24)):
+    name = geojson_name(zoom)
+    if bbox is None:
+        return payloads[name].response(request)
+
+    data = await run_in_threadpool(indexes[name].clip, parse_bbox(bbox))
+    return Payload(data).response(request)
@@ -0,0 +1,46 @@
+import time
+from fastapi import Request
+from fastapi.responses import PlainTextResponse
+
+from .routers import unprotected
+
+from src import metrics
+
+
+# ASGI middleware: request latency until the last body chunk and response size, per route
+# template (so /tiles/{z}/{x}/{y}.png is one series). Event streams are not measured.
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        response = {"status": 500, "size": 0, "stream": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                headers = dict(message.get("headers", ()))
+                response["stream"] = headers.get(b"content-type", b"").startswith(b"text/event-stream")
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not response["stream"]:
+                route = scope.get("route")
+                path = scope.get("root_path", "") + route.path if route is not None else "unmatched"
+                metrics.request_seconds.observe(
+                    time.perf_counter() - start, method=scope["method"], route=path, status=response["status"],
+                )
+                metrics.response_bytes.observe(response["size"], method=scope["method"], route=path)
+
+
+@unprotected.get("/metrics")
+async def get_metrics(request: Request):
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
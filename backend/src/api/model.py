@@ -0,0 +1,48 @@
+from fastapi import Request
+
+from .routers import unprotected
+from .payloads import Payload, payloads, publish
+from .spatial import CollectionsIndex, collections_parts, indexes
+from .geojson import lod_name
+from .events import broadcaster, model_event
+
+import src.config as cfg
+from src import metrics
+
+
+def prepare_collections(collections):
+    return {"payload": Payload(collections).precompress().parts(), "index": collections_parts(collections)}
+
+
+def prepare_model(geojson_data, lods):
+    # Ответы по результату модели готовятся там, где он рассчитан (в процессе расчёта, см. GeoJSONApp.prepare):
+    # JSON сериализуется и сжимается, полигоны индексов переводятся в WKB, geo.json записывается
+    # из готового тела ответа. Процессу API остаётся построить индексы и подменить ссылки (publish_model)
+    release = {"geojson": prepare_collections(geojson_data)}
+    for zoom, data in lods.items():
+        release[lod_name(zoom)] = prepare_collections(data)
+
+    with metrics.stage("json_write"):
+        cfg.GEOJSON_PATH.write_bytes(release["geojson"]["payload"]["body"])
+    return release
+
+
+def publish_model():
+    # Новая стадия расчёта: geojson, его пространственный индекс для запросов по bbox
+    # и сведения о модели, по которым клиент узнаёт об обновлении
+    with metrics.stage("publish"):
+        for name, prepared in cfg.MODEL_RELEASE.items():
+            # Индекс строится до публикации, чтобы опубликованный набор всегда имел индекс
+            indexes[name] = CollectionsIndex(prepared["index"])
+            payloads[name] = Payload.from_parts(**prepared["payload"])
+        publish("model", dict(
+            version=cfg.MODEL_VERSION,
+            quality=cfg.MODEL_QUALITY,
+            final=cfg.MODEL_QUALITY == cfg.MODEL_QUALITIES[-1],
+        ))
+    broadcaster.announce("model", model_event())
+
+
+@unprotected.api_route("/get_model", methods=["GET", "POST"])
+async def get_model(request: Request):
+    return payloads["model"].response(request)
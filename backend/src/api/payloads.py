@@ -0,0 +1,108 @@
+import functools
+import gzip
+import json
+import hashlib
+from fastapi import Request
+from fastapi.responses import Response
+
+import src.config as cfg
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Payload:
+    # JSON-ответ, сериализованный один раз; сжатые варианты считаются при первом запросе
+    # с нужным Accept-Encoding, опубликованные ответы сжимаются заранее (precompress)
+    def __init__(self, data) -> None:
+        self.body: bytes = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        self.etag: str = '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+
+    @functools.cached_property
+    def gzip(self) -> bytes:
+        return gzip.compress(self.body, compresslevel=6)
+
+    @functools.cached_property
+    def brotli(self) -> bytes | None:
+        return brotli.compress(self.body, quality=5) if brotli is not None else None
+
+    def precompress(self) -> "Payload":
+        self.gzip, self.brotli
+        return self
+
+    # Готовые байты ответа для передачи между процессами (см. from_parts)
+    def parts(self) -> dict:
+        return dict(body=self.body, etag=self.etag, gzip=self.gzip, brotli=self.brotli)
+
+    @classmethod
+    def from_parts(cls, body, etag, gzip, brotli) -> "Payload":
+        payload = cls.__new__(cls)
+        payload.body, payload.etag = body, etag
+        # Сжатые варианты записываются поверх cached_property, повторно они не считаются
+        payload.gzip, payload.brotli = gzip, brotli
+        return payload
+
+    def matches(self, request: Request) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is None:
+            return False
+
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags
+
+    def response(self, request: Request) -> Response:
+        headers = {
+            "ETag": self.etag,
+            "Vary": "Accept-Encoding",
+            "Cache-Control": "no-cache",
+        }
+
+        if self.matches(request):
+            return Response(status_code=304, headers=headers)
+
+        accept_encoding = request.headers.get("accept-encoding", "")
+        body = self.body
+        if brotli is not None and "br" in accept_encoding:
+            body = self.brotli
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accept_encoding:
+            body = self.gzip
+            headers["Content-Encoding"] = "gzip"
+
+        return Response(body, media_type="application/json", headers=headers)
+
+
+payloads: dict[str, Payload] = {}
+
+
+# Ответы, зависящие от результата модели, кэшируются по её версии (LRU на maxsize записей);
+# при новой версии кэш сбрасывается целиком
+def version_cache(maxsize):
+    def decorator(function):
+        @functools.lru_cache(maxsize=maxsize)
+        def cached(version, *args):
+            return function(*args)
+
+        cached_version = None
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            nonlocal cached_version
+            version = cfg.MODEL_VERSION
+            if version != cached_version:
+                cached.cache_clear()
+                cached_version = version
+            return cached(version, *args)
+
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
+
+    return decorator
+
+
+def publish(name: str, data) -> Payload:
+    payload = Payload(data).precompress()
+    payloads[name] = payload
+    return payload
@@ -1,14 +1,62 @@
-import json
-from fastapi import Request
+from typing import Optional
+
+import numpy as np
+from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
 from .routers import unprotected
+from .payloads import Payload, payloads
+from .spatial import indexes, parse_bbox, select_points
 
 import src.config as cfg
+from src import loader
+
+
+class Points(BaseModel):
+    points: list[tuple[float, float]]  # [lat, lon]
+
+
+# bbox=min_lon,min_lat,max_lon,max_lat - только датчики внутри области
+@unprotected.api_route("/get_sensors", methods=["GET", "POST"])
+async def get_sensors(request: Request, bbox: Optional[str] = None):
+    if bbox is None:
+        return payloads["sensors"].response(request)
+
+    marks = select_points(indexes["sensors"], parse_bbox(bbox))
+    return Payload(dict(marks=marks)).response(request)
+
+
+# Концентрации на датчиках или в переданных точках, рассчитанные напрямую без сетки
+@unprotected.api_route("/get_sensor_concentrations", methods=["GET", "POST"])
+async def get_sensor_concentrations(request: Request, body: Optional[Points] = None):
+    points = body.points if body is not None else cfg.SENSORS
+    if not points:
+        raise HTTPException(status_code=422, detail="No points given")
+    if len(points) > cfg.POINTS_MAX:
+        raise HTTPException(status_code=422, detail=f"At most {cfg.POINTS_MAX} points per request")
+    # Карта в режиме ряда (MET_SERIES_PATH) - среднее за ряд, расчёт по текущей погоде ей бы не соответствовал
+    if loader.gd.met_series is not None:
+        raise HTTPException(status_code=409, detail="Point concentrations are not available for a met series average")
+
+    lats, lons = np.array(points, dtype=float).T
+    conc = await run_in_threadpool(loader.gd.point_concentrations, lats, lons)
+    if conc is None:
+        raise HTTPException(status_code=503, detail="Model has not been run yet")
 
+    total = conc.sum(axis=0)
+    dominant = conc.argmax(axis=0)
 
-@unprotected.post("/get_sensors")
-async def get_sensors(request: Request):
-    return JSONResponse(json.dumps(dict(
-        marks=cfg.SENSORS
-    )))
\ No newline at end of file
+    return JSONResponse({
+        "version": cfg.MODEL_VERSION,
+        "points": [
+            {
+                "lat": float(lat),
+                "lon": float(lon),
+                "concentration": float(value),  # г/м3
+                "factory": int(factory) if value > 0 else None,
+            }
+            for lat, lon, value, factory in zip(lats, lons, total, dominant)
+        ],
+    })
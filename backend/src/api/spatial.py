@@ -0,0 +1,107 @@
+import json
+import numpy as np
+import shapely
+from shapely.geometry import shape, mapping
+from fastapi import HTTPException
+
+
+# Область запроса: bbox=min_lon,min_lat,max_lon,max_lat (порядок GeoJSON)
+def parse_bbox(bbox: str):
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+
+    if not (min_lon < max_lon and min_lat < max_lat):
+        raise HTTPException(status_code=422, detail="bbox is empty")
+
+    return shapely.box(min_lon, min_lat, max_lon, max_lat)
+
+
+class SpatialIndex:
+    # STRtree над геометриями (lon, lat); items - то, что возвращается для каждой геометрии
+    def __init__(self, geometries, items) -> None:
+        self.geometries = np.array(geometries, dtype=object)
+        self.items = items
+        self.tree = shapely.STRtree(self.geometries)
+
+    def query(self, area):
+        # -> [(элемент, геометрия, лежит ли целиком в области)]; иначе геометрия обрезана по области
+        hits = np.sort(self.tree.query(area, predicate="intersects"))
+        covered = shapely.covered_by(self.geometries[hits], area)
+        return [
+            (self.items[i], self.geometries[i] if inside else shapely.intersection(self.geometries[i], area), inside)
+            for i, inside in zip(hits, covered)
+        ]
+
+
+def polygonal(geometry):
+    # Обрезка полигона по краю области может дать линии и точки касания, они отбрасываются
+    parts = [part for part in shapely.get_parts(geometry) if part.geom_type == "Polygon"]
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else shapely.MultiPolygon(parts)
+
+
+# Полигоны результата модели (список FeatureCollection, по одной на предприятие или одна общая)
+# в виде, который дёшево передать между процессами: WKB одним блоком со смещениями, номер коллекции
+# и свойства (JSON) каждого полигона. Готовится там же, где рассчитана модель (api/model.prepare_model)
+def collections_parts(collections):
+    geometries = []
+    numbers = []
+    properties = []
+    for number, collection in enumerate(collections):
+        for feature in collection["features"]:
+            geometries.append(shape(feature["geometry"]))
+            numbers.append(number)
+            properties.append(feature["properties"])
+
+    geometries = np.array(geometries, dtype=object)
+    # Округление координат при сериализации может дать самопересечения, обрезка их не допускает
+    invalid = ~shapely.is_valid(geometries)
+    geometries[invalid] = shapely.make_valid(geometries[invalid])
+    wkb = shapely.to_wkb(geometries)
+
+    return {
+        "wkb": b"".join(wkb),
+        "offsets": np.cumsum([0] + [len(item) for item in wkb]),
+        "numbers": np.array(numbers, dtype=np.int64),
+        "properties": json.dumps(properties, separators=(",", ":")).encode("utf-8"),
+        "collections": len(collections),
+    }
+
+
+class CollectionsIndex(SpatialIndex):
+    def __init__(self, parts) -> None:
+        wkb, offsets = parts["wkb"], parts["offsets"].tolist()
+        geometries = shapely.from_wkb([wkb[start:end] for start, end in zip(offsets[:-1], offsets[1:])])
+        properties = json.loads(parts["properties"])
+
+        super().__init__(geometries, list(zip(parts["numbers"].tolist(), properties)))
+        self.collections = parts["collections"]
+
+    def clip(self, area):
+        collections = [{"type": "FeatureCollection", "features": []} for _ in range(self.collections)]
+        for (number, properties), geometry, inside in self.query(area):
+            if not inside:
+                geometry = polygonal(geometry)
+                if geometry is None:
+                    continue
+            collections[number]["features"].append(
+                {"type": "Feature", "geometry": mapping(geometry), "properties": properties}
+            )
+
+        # Коллекции без полигонов в области не передаются
+        return [collection for collection in collections if collection["features"]]
+
+
+# Точки: предприятия и датчики, элементы возвращаются как есть
+def points_index(lons, lats, items) -> SpatialIndex:
+    return SpatialIndex(shapely.points(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float)), items)
+
+
+def select_points(index: SpatialIndex, area):
+    return [item for item, _, _ in index.query(area)]
+
+
+indexes: dict[str, SpatialIndex] = {}
@@ -0,0 +1,23 @@
+from fastapi import Request, HTTPException
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from .routers import unprotected
+from .payloads import version_cache
+
+import src.config as cfg
+from src.gaussian_distribution.tiles import render_tile
+
+
+@version_cache(maxsize=cfg.TILE_CACHE_SIZE)
+def cached_tile(z, x, y):
+    return render_tile(cfg.MODEL_FIELD, z, x, y)
+
+
+@unprotected.get("/tiles/{z}/{x}/{y}.png")
+async def get_tile(request: Request, z: int, x: int, y: int):
+    if not (0 <= z <= 22 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile not found")
+
+    tile = await run_in_threadpool(cached_tile, z, x, y)
+    return Response(tile, media_type="image/png", headers={"Cache-Control": "no-cache"})
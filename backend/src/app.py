@@ -4,9 +4,12 @@ from contextlib import asynccontextmanager
 import src.config as cfg
 import uvicorn
 from loguru import logger
-from src.api import sensors, geojson, factories
+from src import metrics
+from src.api import sensors, geojson, factories, cross_section, tiles, model, events, metrics as metrics_api
 from src.api.routers import unprotected
-from src.loader import app, gd, executor
+from src.api.model import publish_model
+from src import loader
+from src.loader import app
 
 shutdown_event = asyncio.Event()
 
@@ -15,13 +18,20 @@ async def run_background_task():
 
     while True:
         loop = asyncio.get_running_loop()
-        await loop.run_in_executor(executor, gd.run)
-        logger.info("Geojson has been updated successfully!")
-        await asyncio.sleep(1200)
+        with metrics.recording() as stages, metrics.stage("cycle"):
+            # Погода запрашивается в цикле событий, поток модели не ждёт сеть
+            with metrics.stage("weather_fetch"):
+                weather_data = await loader.weather_provider.fetch()
+            await loop.run_in_executor(
+                loader.executor, loader.gd.run_progressive, cfg.MODEL_QUALITIES, publish_model, weather_data
+            )
+        logger.info(f"Geojson has been updated successfully! {metrics.summarize(stages)}")
+        await asyncio.sleep(cfg.MODEL_INTERVAL)
 
 
 @asynccontextmanager
 async def my_lifespan(_):
+    loader.startup()
     logger.info("Server is running!")
     task = asyncio.create_task(run_background_task())
     
@@ -37,7 +47,7 @@ async def my_lifespan(_):
         except asyncio.CancelledError:
             logger.info("Background task cancelled.")
 
-        executor.shutdown(wait=False, cancel_futures=True)
+        await loader.shutdown()
         logger.info("Server shutdown")
 
 
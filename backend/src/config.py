@@ -17,6 +17,42 @@ API_OPENWEATHERMAP = env.str("API_OPENWEATHERMAP")
 API_OPENWEATHERMAP_CITY = env.str("API_OPENWEATHERMAP_CITY")
 API_OPENWEATHERMAP_URL = f'http://api.openweathermap.org/data/2.5/weather?q={API_OPENWEATHERMAP_CITY}&appid={API_OPENWEATHERMAP}&units=metric'
 
+# "openweathermap" or "replay" (recorded responses from WEATHER_REPLAY_PATH), see weather.weather_providers
+WEATHER_PROVIDER = env.str("WEATHER_PROVIDER", "openweathermap")
+WEATHER_TIMEOUT = env.float("WEATHER_TIMEOUT", 10)
+# Seconds a fetched weather is reused. Kept below MODEL_INTERVAL on purpose: every model cycle
+# gets fresh weather, the TTL only deduplicates fetches made within one cycle
+WEATHER_TTL = env.float("WEATHER_TTL", 600)
+WEATHER_RECORD_PATH = env.str("WEATHER_RECORD_PATH", None)
+WEATHER_REPLAY_PATH = env.str("WEATHER_REPLAY_PATH", str(BACKEND_SRC_ROOT / "data" / "weather_replay.jsonl"))
+
+# "per_factory" or "superposed", see GeoJSONApp.modes
+MODEL_MODE = env.str("MODEL_MODE", "per_factory")
+TILE_CACHE_SIZE = env.int("TILE_CACHE_SIZE", 2048)
+# Serialised cross-sections kept per model version (about 1 MB each at High quality)
+CROSS_SECTION_CACHE_SIZE = env.int("CROSS_SECTION_CACHE_SIZE", 64)
+# Model results cached on disk by quantized weather; 0 disables the cache
+RESULT_CACHE_DIR = Path(env.str("RESULT_CACHE_DIR", str(BACKEND_SRC_ROOT / "data" / "cache")))
+RESULT_CACHE_SIZE = env.int("RESULT_CACHE_SIZE", 64)
+# Grid qualities computed and published in turn on every model run, coarse to fine
+MODEL_QUALITIES = env.list("MODEL_QUALITIES", ["Low", "Medium", "High"])
+# Most points accepted by /get_sensor_concentrations; the matrix is (factories, points)
+POINTS_MAX = env.int("POINTS_MAX", 10_000)
+# Seconds between the end of a model cycle and the next weather fetch
+MODEL_INTERVAL = env.float("MODEL_INTERVAL", 1200)
+# Worker processes running the model; 0 runs it in the API process
+MODEL_WORKERS = env.int("MODEL_WORKERS", 1)
+# Nested grids that coarsen away from the sources instead of one uniform grid (see RSDM.nested_levels)
+MODEL_ADAPTIVE = env.bool("MODEL_ADAPTIVE", False)
+# Plan grid implementation: "numpy", "numba" (JIT, compiled on the first run and cached on disk),
+# "cached" (resampled plume kernel) or "python" (reference), see disperse.dispersion_backends
+MODEL_BACKEND = env.str("MODEL_BACKEND", "numpy")
+# Hourly met series (CSV or Parquet, see met_series.py) to average over instead of the current weather
+MET_SERIES_PATH = env.str("MET_SERIES_PATH", None)
+# Map zoom levels with their own simplified polygon set; /api/get_geojson?zoom=z serves the
+# smallest level >= z, finer zooms get the full-detail set
+GEOJSON_LOD_ZOOMS = env.list("GEOJSON_LOD_ZOOMS", [8, 10, 12], subcast=int)
+
 SENSORS = [
     [56.330159, 43.838768],
 	[56.350876, 43.867143],
@@ -39,9 +75,13 @@ SENSORS = [
 	[56.231803, 43.944712]
 ]
 
-GEOJSON_DATA = {
-    "type": "FeatureCollection", 
-    "features": []
-}
+# Prepared API responses of the latest model run by payload name: serialised geojson
+# and its index geometries, including simplified sets per zoom level (see api/model.prepare_model)
+MODEL_RELEASE = {}
 
 FACTORIES = {}
+
+# Band raster of the latest model run (process.BandField), its grid quality and version
+MODEL_FIELD = None
+MODEL_QUALITY = None
+MODEL_VERSION = 0
@@ -1,6 +1,9 @@
 import math
+import functools
 import numpy as np
 
+from . import numba_kernels
+
 # Константы
 g = 9.80616  # Ускорение свободного падения
 
@@ -10,15 +13,18 @@ def sigma_y(c, d):
         return 465.11628 * x * math.tan(theta)
     return inner
 
-SigmaY = {
-    "A": sigma_y(24.1670, 2.5334),
-    "B": sigma_y(18.3330, 1.8096),
-    "C": sigma_y(12.5000, 1.0857),
-    "D": sigma_y(8.3330, 0.72382),
-    "E": sigma_y(6.2500, 0.54287),
-    "F": sigma_y(4.1667, 0.36191),
+# Коэффициенты (c, d) формулы sigma_y для каждой категории PG
+sigma_y_coeffs = {
+    "A": (24.1670, 2.5334),
+    "B": (18.3330, 1.8096),
+    "C": (12.5000, 1.0857),
+    "D": (8.3330, 0.72382),
+    "E": (6.2500, 0.54287),
+    "F": (4.1667, 0.36191),
 }
 
+SigmaY = {pgcat: sigma_y(c, d) for pgcat, (c, d) in sigma_y_coeffs.items()}
+
 def sigma_z(a, b, x):
     return a * (x ** b)
 
@@ -129,6 +135,83 @@ SigmaZ = {
 	"F": sigma_zf,
 };
 
+# Табличное представление sigma_za..sigma_zf для векторных вычислений.
+# Каждая строка: (верхняя граница x [km], a, b), последняя граница - inf.
+# Вторым элементом идёт ограничение сверху для sz (inf - без ограничения).
+sigma_z_tables = {
+    "A": ((
+        (0.10, 122.800, 0.94470),
+        (0.15, 158.080, 1.05420),
+        (0.20, 170.220, 1.09320),
+        (0.25, 179.520, 1.12620),
+        (0.30, 217.410, 1.26440),
+        (0.40, 258.890, 1.40940),
+        (0.50, 346.750, 1.72830),
+        (3.11, 453.850, 2.11660),
+        (math.inf, 5000.0, 0.0),
+    ), 5000.0),
+    "B": ((
+        (0.20, 90.673, 0.93198),
+        (0.40, 98.483, 0.98332),
+        (math.inf, 109.300, 1.09710),
+    ), 5000.0),
+    "C": ((
+        (math.inf, 61.141, 0.91465),
+    ), 5000.0),
+    "D": ((
+        (0.30, 34.459, 0.86974),
+        (1.00, 32.093, 0.81066),
+        (3.00, 32.093, 0.64403),
+        (10.00, 33.504, 0.60486),
+        (30.00, 36.650, 0.56589),
+        (math.inf, 44.053, 0.51179),
+    ), math.inf),
+    "E": ((
+        (0.10, 24.260, 0.83660),
+        (0.30, 23.331, 0.81956),
+        (1.00, 21.628, 0.75660),
+        (2.00, 21.628, 0.63077),
+        (4.00, 22.534, 0.57154),
+        (10.00, 24.703, 0.50527),
+        (20.00, 26.970, 0.46713),
+        (40.00, 35.420, 0.37615),
+        (math.inf, 47.618, 0.29592),
+    ), math.inf),
+    "F": ((
+        (0.20, 15.209, 0.81558),
+        (0.70, 14.457, 0.78407),
+        (1.00, 13.953, 0.68465),
+        (2.00, 13.953, 0.63227),
+        (3.00, 14.823, 0.54503),
+        (7.00, 16.187, 0.46490),
+        (15.00, 17.836, 0.41507),
+        (30.00, 22.651, 0.32681),
+        (60.00, 27.074, 0.27436),
+        (math.inf, 34.219, 0.21716),
+    ), math.inf),
+}
+
+
+def sigma_y_array(x, pgcat):
+    c, d = sigma_y_coeffs[pgcat]
+    theta = 0.017453293 * (c - d * np.log(x))
+    return 465.11628 * x * np.tan(theta)
+
+
+sigma_z_arrays = {
+    pgcat: (*(np.array(col) for col in zip(*rows)), cap)
+    for pgcat, (rows, cap) in sigma_z_tables.items()
+}
+
+
+def sigma_z_array(x, pgcat):
+    bounds, a, b, cap = sigma_z_arrays[pgcat]
+
+    # searchsorted(side="left") повторяет условия вида "x <= граница"
+    branch = np.searchsorted(bounds, x, side="left")
+    sz = a[branch] * x ** b[branch]
+    return np.minimum(sz, cap)
+
 
 wind_profile = {
     "urban": {
@@ -192,6 +275,65 @@ def C(x, y, z, Uz, Q, H, sigY, sigZ):
     return conc
 
 
+# Vectorised counterpart of C(): x, y and z may be arrays of any broadcastable shape.
+# Sigma formulas are selected by Pasquill-Gifford category instead of being passed in.
+# With sigma_cutoff set, receptors further than sigma_cutoff * sigma_y from the plume
+# centreline are left at zero without evaluating sigma_z and the exponentials.
+
+# returns:
+# conc	[g/m3]	array of receptor concentrations, zero upwind and where non-finite
+
+def C_array(x, y, z, Uz, Q, H, pgcat, sigma_cutoff=None):
+    x, y, z = np.broadcast_arrays(
+        np.asarray(x, dtype=np.float64),
+        np.asarray(y, dtype=np.float64),
+        np.asarray(z, dtype=np.float64),
+    )
+    conc = np.zeros(x.shape)
+
+    # Концентрация вверх по потоку всегда равна нулю
+    inside = x > 0
+    if not inside.any():
+        return conc
+
+    with np.errstate(divide="ignore", over="ignore", invalid="ignore"):
+        Sy = sigma_y_array(x[inside], pgcat)
+
+        # Отбрасываем приёмники за пределами клина факела
+        if sigma_cutoff is not None:
+            wedge = np.abs(y[inside]) <= sigma_cutoff * np.abs(Sy)
+            inside[inside] = wedge
+            Sy = Sy[wedge]
+
+        xd = x[inside]
+        yd = y[inside]
+        zd = z[inside]
+
+        Sz = sigma_z_array(xd, pgcat)
+
+        Sz2 = 2 * Sz * Sz
+        Sy2 = 2 * Sy * Sy
+
+        c1 = Q / (2 * np.pi * Uz * Sy * Sz)
+        c2 = np.exp(-1 * (zd - H) ** 2 / Sz2)
+        c3 = np.exp(-1 * (zd + H) ** 2 / Sz2)
+        c4 = np.exp(-1 * yd ** 2 / Sy2)
+
+        values = c1 * (c2 + c3) * c4  # г/м3
+
+    values[~np.isfinite(values)] = 0
+    conc[inside] = values
+    return conc
+
+
+# Upper bound on the fraction of emitted mass dropped by a crosswind cutoff of
+# sigma_cutoff * sigma_y: the two Gaussian tails beyond the wedge edges.
+
+def wedge_truncation(sigma_cutoff):
+    if sigma_cutoff is None:
+        return 0.0
+    return math.erfc(sigma_cutoff / math.sqrt(2))
+
 
 # Calculates the plume rise (dH) and a downwind plume offset (Xf), using Briggs model.
 
@@ -253,51 +395,387 @@ def plumeRise(us, vs, ds, Ts, Ta, pgcat):
     return dH, Xf
 
 
-# Iterate though each met hour and calculate concentrations across plan and slice grids.
+# Array counterpart of plumeRise(): us, vs, ds and Ts are arrays over sources (or broadcastable
+# scalars), the stability category is shared by all of them. Every branch is evaluated and
+# the applicable one is selected per source.
 
-# Uses a single source located at the origin, at a user specified height.
+def plumeRise_array(us, vs, ds, Ts, Ta, pgcat):
+    us, vs, ds, Ts = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (us, vs, ds, Ts)))
 
-def iter_disp(rsdm, met, ambient_temp):
+    # Вычисление потока подъемной силы и импульсного потока
+    Fb = g * vs * ds ** 2 * (Ts - Ta) / (4 * Ts)
+    Fm = vs ** 2 * ds ** 2 * Ta / (4 * Ts)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Подъём за счёт импульса без учёта подъемной силы
+        momentum = 3.0 * ds * vs / us
+
+        # Стабильные категории PG
+        if pgcat in ["E", "F"]:
+            eta = 0.020 if pgcat == "E" else 0.035
+            s = g * eta / Ta
+            dT = 0.019582 * Ts * vs * np.sqrt(s)
+
+            buoyant = (Ts - Ta) >= dT
+            Xf = np.where(buoyant, 2.0715 * us / np.sqrt(s), 0.0)
+            dH = np.where(
+                buoyant,
+                2.6 * (Fb / (us * s)) ** (1/3),
+                np.minimum(momentum, 1.5 * (Fm / (us * np.sqrt(s))) ** (1/3)),
+            )
+        else:
+            # Нестабильные или нейтральные категории PG
+            small = Fb < 55.0
+            dT = np.where(
+                small,
+                0.0297 * Ts * vs ** (1/3) / ds ** (2/3),
+                0.00575 * Ts * vs ** (2/3) / ds ** (1/3),
+            )
+            buoyant = (Ts - Ta) >= dT
+            Xf = np.where(buoyant, np.where(small, 49.0 * Fb ** (5/8), 119.0 * Fb ** 0.4), 0.0)
+            dH = np.where(
+                buoyant,
+                np.where(small, 21.425 * Fb ** (3/4), 38.71 * Fb ** 0.6) / us,
+                momentum,
+            )
+
+    return dH, Xf
+
+
+# Effective wind speed, plume height, emission rate and plume rise offset of a source for one met hour.
+
+def plume_params(rsdm, source, metline, ambient_temp):
+    # Вычисление эффективной скорости ветра на выходе из трубы 
+    Uz = calc_uz(metline.u, source.elevation, 10, metline.pgcat, rsdm.roughness)
+
+    # Вычисление подъема дымовой трубы с использованием уравнений Бриггса
+    Ts = source.temp + 273.15
+    if metline.temp is not None:
+        ambient_temp = metline.temp
+    dH, Xf = plumeRise(Uz, source.velocity, source.diameter, Ts, ambient_temp, metline.pgcat)
+    H = source.elevation + dH
+    Q = source.emission
+
+    return Uz, H, Q, Xf
+
+
+# Stack parameters of the sources as arrays, in the order of rsdm.sources (see plume_params_array).
+
+def source_arrays(sources):
+    return {
+        name: np.array([getattr(source, name) for source in sources], dtype=np.float64)
+        for name in ("elevation", "diameter", "velocity", "temp", "emission")
+    }
+
+
+# plume_params() for all sources at once, grouped: (source indices, (Uz, H, Q, Xf)) for every
+# distinct set of plume parameters, so sources with identical stacks share one evaluation.
+
+def plume_params_array(rsdm, stacks, metline, ambient_temp):
+    Uz = calc_uz(metline.u, stacks["elevation"], 10, metline.pgcat, rsdm.roughness)
+
+    Ts = stacks["temp"] + 273.15
+    if metline.temp is not None:
+        ambient_temp = metline.temp
+    dH, Xf = plumeRise_array(Uz, stacks["velocity"], stacks["diameter"], Ts, ambient_temp, metline.pgcat)
+    H = stacks["elevation"] + dH
+    Q = stacks["emission"]
+
+    params = np.stack([Uz, H, Q, Xf], axis=1)
+    unique, inverse = np.unique(params, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    return [(np.flatnonzero(inverse == i), tuple(float(v) for v in row)) for i, row in enumerate(unique)]
+
+
+# Reference implementation: evaluates C() cell by cell in pure Python, without a wedge cutoff.
+
+def plan_python(rsdm, metline, source, Uz, H, Q, Xf):
     # Смещения массива PNG
     yc = len(rsdm.rGrid) - 1
-    zc = rsdm.hCoords.ymax / rsdm.hCoords.ygap
+
+    sinPHI = np.sin(metline.phi)
+    cosPHI = np.cos(metline.phi)
+    sigY = SigmaY[metline.pgcat]
+    sigZ = SigmaZ[metline.pgcat]
+
+    # Вычисление концентраций для плоской сетки (фиксированная высота сетки равна 0 м)
+    x_index = 0
+    for Xr in range(rsdm.rCoords.xmin, rsdm.rCoords.xmax + rsdm.rCoords.xgap, rsdm.rCoords.xgap):
+        y_index = 0
+        for Yr in range(rsdm.rCoords.ymin, rsdm.rCoords.ymax + rsdm.rCoords.ygap, rsdm.rCoords.ygap):
+            if Uz > 0.5:
+                xx, yy = source.wind_components(Xr, Yr, sinPHI, cosPHI)
+                xx -= (Xf / 1000)  # Коррекция подъема дымовой трубы
+                rsdm.rGrid[yc - y_index][x_index] += C(xx, yy, 0, Uz, Q, H, sigY, sigZ) / metline.hours
+            y_index += 1
+        x_index += 1
+
+
+# Whole-array implementation: evaluates the plan grid one row of tiles at a time using C_array().
+
+# The plan grid is split into TILE x TILE cell tiles; only tiles that may intersect the
+# downwind plume wedge are evaluated, the rest are guaranteed (near) zeros.
+TILE = 32
+
+def wedge_tiles(rsdm, source, sinPHI, cosPHI, Xf, pgcat):
+    rows, cols = rsdm.rGrid.shape
+    tile_rows = -(-rows // TILE)
+    tile_cols = -(-cols // TILE)
+
+    # Центры плиток и радиус описанной окружности (м)
+    Xt = rsdm.rCoords.xmin + rsdm.rCoords.xgap * (np.arange(tile_cols) * TILE + (TILE - 1) / 2) - source.x
+    Yt = rsdm.rCoords.ymin + rsdm.rCoords.ygap * (rows - 1 - (np.arange(tile_rows) * TILE + (TILE - 1) / 2)) - source.y
+    radius = TILE / 2 * math.hypot(rsdm.rCoords.xgap, rsdm.rCoords.ygap)
+
+    Yt = Yt[:, np.newaxis]
+    xx = (-1 * Xt * sinPHI - Yt * cosPHI) / 1000 - Xf / 1000 + radius / 1000
+    yy = Xt * cosPHI - Yt * sinPHI
+
+    # Плитка целиком вверх по потоку не содержит ненулевых концентраций
+    inside = xx > 0
+    if rsdm.sigma_cutoff is not None:
+        # sigma_y растёт с расстоянием, поэтому дальний край плитки даёт самый широкий клин
+        with np.errstate(divide="ignore", invalid="ignore"):
+            Sy = np.abs(sigma_y_array(np.where(inside, xx, 1.0), pgcat))
+        inside &= np.abs(yy) - radius <= rsdm.sigma_cutoff * Sy
+
+    return inside
+
+
+# Blocks of the plan grid inside the wedge, one row of tiles at a time:
+# yields (grid index of the block, downwind distance xx in km, crosswind offset yy in m).
+def wedge_blocks(rsdm, source, sinPHI, cosPHI, Xf, pgcat):
+    # Строка 0 сетки соответствует ymax, поэтому координаты y идут по убыванию.
+    rows, cols = rsdm.rGrid.shape
+    Xr = rsdm.rCoords.xmin + rsdm.rCoords.xgap * np.arange(cols) - source.x
+    Yr = rsdm.rCoords.ymin + rsdm.rCoords.ygap * np.arange(rows)[::-1] - source.y
+
+    tiles = wedge_tiles(rsdm, source, sinPHI, cosPHI, Xf, pgcat)
+    offsets = np.arange(TILE)
+
+    for tile_row, tile_cols in enumerate(tiles):
+        if not tile_cols.any():
+            continue
+
+        start = tile_row * TILE
+        col_index = (np.flatnonzero(tile_cols)[:, np.newaxis] * TILE + offsets).ravel()
+        col_index = col_index[col_index < cols]
+
+        Xb = Xr[col_index]
+        Yb = Yr[start:start + TILE, np.newaxis]
+        xx = (-1 * Xb * sinPHI - Yb * cosPHI) / 1000 - Xf / 1000  # Коррекция подъема дымовой трубы
+        yy = Xb * cosPHI - Yb * sinPHI
+        yield (slice(start, start + TILE), col_index), xx, yy
+
+
+def plan_numpy(rsdm, metline, source, Uz, H, Q, Xf):
+    if Uz <= 0.5:
+        return
+
+    sinPHI = np.sin(metline.phi)
+    cosPHI = np.cos(metline.phi)
+
+    # Вычисление концентраций для плоской сетки (фиксированная высота сетки равна 0 м)
+    for block, xx, yy in wedge_blocks(rsdm, source, sinPHI, cosPHI, Xf, metline.pgcat):
+        rsdm.rGrid[block] += C_array(xx, yy, 0, Uz, Q, H, metline.pgcat, rsdm.sigma_cutoff) / metline.hours
+
+
+# JIT-compiled implementation: same formulas as C(), run in parallel over grid rows.
+
+def plan_numba(rsdm, metline, source, Uz, H, Q, Xf):
+    if Uz <= 0.5:
+        return
+
+    sinPHI = np.sin(metline.phi)
+    cosPHI = np.cos(metline.phi)
+    c, d = sigma_y_coeffs[metline.pgcat]
+    bounds, a, b, cap = sigma_z_arrays[metline.pgcat]
+
+    cutoff = math.inf if rsdm.sigma_cutoff is None else rsdm.sigma_cutoff
+    tiles = wedge_tiles(rsdm, source, sinPHI, cosPHI, Xf, metline.pgcat)
+
+    numba_kernels.plan_grid(
+        rsdm.rGrid, tiles, TILE, rsdm.rCoords.xmin, rsdm.rCoords.ymin, rsdm.rCoords.xgap, rsdm.rCoords.ygap,
+        source.x, source.y, sinPHI, cosPHI, Xf,
+        Uz, Q, H, metline.hours, cutoff, c, d, bounds, a, b, cap,
+    )
+
+
+# Wind-aligned plume kernel. At ground level C() factorises into an along-wind profile
+# and an analytic crosswind Gaussian:
+#   C(x, y, 0) = Q / Uz * profile(x) * exp(-y^2 / (2 * sigma_y(x)^2))
+# The profile does not depend on wind direction, speed or emission rate, so it is
+# cached per (pgcat, H, grid step, length) and a new wind direction only costs
+# rotating the grid and interpolating the cached profile.
+
+KERNEL_OVERSAMPLE = 4    # profile samples per grid step
+KERNEL_H_QUANTUM = 0.1   # m, effective stack height rounding of the cache key
+
+@functools.lru_cache(maxsize=32)
+def plume_kernel(pgcat, H, step, length):
+    x = np.arange(0, length + 2 * step, step) / 1000  # km
+
+    profile = C_array(x, 0.0, 0.0, 1.0, 1.0, H, pgcat)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma = np.abs(sigma_y_array(np.where(x > 0, x, 1.0), pgcat))
+
+    profile.flags.writeable = False
+    sigma.flags.writeable = False
+    return profile, sigma
+
+
+def sample_kernel(kernel, step, x, y, sigma_cutoff=None):
+    profile, sigma = kernel
+
+    # Линейная интерполяция профиля по расстоянию вдоль факела (x в км)
+    position = x * 1000 / step
+    index = np.floor(position).astype(np.intp)
+    inside = (x > 0) & (index < len(profile) - 1)
+    index = np.where(inside, index, 0)
+    weight = position - index
+
+    Sy = sigma[index] * (1 - weight) + sigma[index + 1] * weight
+    if sigma_cutoff is not None:
+        inside &= np.abs(y) <= sigma_cutoff * Sy
+
+    with np.errstate(divide="ignore", over="ignore", invalid="ignore"):
+        conc = profile[index] * (1 - weight) + profile[index + 1] * weight
+        conc = conc * np.exp(-1 * y ** 2 / (2 * Sy * Sy))
+
+    conc[~inside | ~np.isfinite(conc)] = 0
+    return conc
+
+
+# Cached-kernel implementation: the plan grid is resampled from plume_kernel().
+
+def plan_cached(rsdm, metline, source, Uz, H, Q, Xf):
+    if Uz <= 0.5:
+        return
+
+    sinPHI = np.sin(metline.phi)
+    cosPHI = np.cos(metline.phi)
+
+    # Длина профиля - расстояние от источников до самого дальнего угла сетки, округлённое до километра.
+    # Она общая для всех источников, чтобы трубы с одинаковыми параметрами делили одно ядро
+    length = max(
+        math.hypot(x - other.x, y - other.y)
+        for other in rsdm.sources
+        for x in (rsdm.rCoords.xmin, rsdm.rCoords.xmax)
+        for y in (rsdm.rCoords.ymin, rsdm.rCoords.ymax)
+    )
+    length = 1000 * math.ceil(length / 1000)
+    step = rsdm.rCoords.xgap / KERNEL_OVERSAMPLE
+    H = round(H / KERNEL_H_QUANTUM) * KERNEL_H_QUANTUM
+    kernel = plume_kernel(metline.pgcat, H, step, length)
+
+    for block, xx, yy in wedge_blocks(rsdm, source, sinPHI, cosPHI, Xf, metline.pgcat):
+        conc = sample_kernel(kernel, step, xx, yy, rsdm.sigma_cutoff)
+        rsdm.rGrid[block] += Q / Uz * conc / metline.hours
+
+
+# Plan grid implementation of every backend
+dispersion_backends = {
+    "python": plan_python,
+    "numpy": plan_numpy,
+    "numba": plan_numba,
+    "cached": plan_cached,
+}
+
+
+# Iterate though each met hour and calculate concentrations across the plan grid.
+
+# Plan concentrations of all sources are superposed on the plan grid.
+# The per-hour grid evaluation is delegated to the backend selected on the model;
+# plume parameters are computed for all sources at once.
+
+def iter_disp(rsdm, met, ambient_temp):
+    plan = dispersion_backends[rsdm.backend]
+    stacks = source_arrays(rsdm.sources)
 
     for metline in met:
-        # Вычисление эффективной скорости ветра на выходе из трубы 
-        Uz = calc_uz(metline.u, rsdm.source.elevation, 10, metline.pgcat, rsdm.roughness)
+        for indices, (Uz, H, Q, Xf) in plume_params_array(rsdm, stacks, metline, ambient_temp):
+            for index in indices:
+                plan(rsdm, metline, rsdm.sources[index], Uz, H, Q, Xf)
+
+
+# Calculate concentrations on the vertical slice through the reference source (rsdm.source)
+# along the given azimuth (radians clockwise from north), for each met hour.
+
+# The slice spans hCoords: x is the signed distance along the azimuth (m), y the height (m),
+# row 0 of hGrid corresponds to the top of the slice.
 
-        # Вычисление подъема дымовой трубы с использованием уравнений Бриггса
-        Ts = rsdm.source.temp + 273.15
-        dH, Xf = plumeRise(Uz, rsdm.source.velocity, rsdm.source.diameter, Ts, ambient_temp, metline.pgcat)
-        H = rsdm.source.elevation + dH
-        Q = rsdm.source.emission
+def iter_slice(rsdm, met, ambient_temp, azimuth):
+    rows, cols = rsdm.hGrid.shape
+    distance = rsdm.hCoords.xmin + rsdm.hCoords.xgap * np.arange(cols)
+    Zh = rsdm.hCoords.ymin + rsdm.hCoords.ygap * np.arange(rows)[::-1, np.newaxis]
+
+    # Смещения точек среза относительно трубы (м, восток и север)
+    Xr = distance * np.sin(azimuth)
+    Yr = distance * np.cos(azimuth)
+
+    for metline in met:
+        Uz, H, Q, Xf = plume_params(rsdm, rsdm.source, metline, ambient_temp)
+        if Uz <= 0.5:
+            continue
 
         sinPHI = np.sin(metline.phi)
         cosPHI = np.cos(metline.phi)
-        sigY = SigmaY[metline.pgcat]
-        sigZ = SigmaZ[metline.pgcat]
-
-        # Вычисление концентраций для плоской сетки (фиксированная высота сетки равна 0 м)
-        x_index = 0
-        for Xr in range(rsdm.rCoords.xmin, rsdm.rCoords.xmax + rsdm.rCoords.xgap, rsdm.rCoords.xgap):
-            y_index = 0
-            for Yr in range(rsdm.rCoords.ymin, rsdm.rCoords.ymax + rsdm.rCoords.ygap, rsdm.rCoords.ygap):
-                if Uz > 0.5:
-                    xx, yy = rsdm.source.wind_components(Xr, Yr, sinPHI, cosPHI)
-                    xx -= (Xf / 1000)  # Коррекция подъема дымовой трубы
-                    rsdm.rGrid[yc - y_index][x_index] += C(xx, yy, 0, Uz, Q, H, sigY, sigZ) / metline.hours
-                y_index += 1
-            x_index += 1
-
-        # Вычисление концентраций для двумерного среза вдоль профиля высоты дымовой трубы
-        z_index = 0
-        offset = (rsdm.hCoords.xmax - rsdm.hCoords.xmin) / (2 * rsdm.hCoords.xgap)
-        
-        for Zh in range(0, int(rsdm.hCoords.ymax) + int(rsdm.hCoords.ygap), int(rsdm.hCoords.ygap)):
-            x_index = 0
-            if Uz > 0.5:
-                for Xh in range(0, int(rsdm.hCoords.xmax) + int(rsdm.hCoords.xgap), int(rsdm.hCoords.xgap)):
-                    xx = (Xh - Xf) / 1000  # Включает коррекцию подъема дымовой трубы
-                    rsdm.hGrid[int(zc - z_index)][int(offset + x_index)] += C(xx, 0.0, Zh, Uz, Q, H, sigY, sigZ) / metline.hours
-                    x_index += 1
-            z_index += 1
+        xx = (-1 * Xr * sinPHI - Yr * cosPHI) / 1000 - Xf / 1000  # Коррекция подъема дымовой трубы
+        yy = Xr * cosPHI - Yr * sinPHI
+        rsdm.hGrid += C_array(xx, yy, Zh, Uz, Q, H, metline.pgcat) / metline.hours
+
+
+# Calculate concentrations on the downwind centreline slice of the reference source (rsdm.source)
+# for each met hour: the half of hGrid at and beyond the stack, whatever the wind direction.
+
+# The plan image is banded against the larger of the plan grid and this slice maximum
+# (RSDM.update_image). The slice is small, so it is evaluated with C_array for every backend.
+
+def iter_centreline(rsdm, met, ambient_temp):
+    rows, cols = rsdm.hGrid.shape
+    zc = int(rsdm.hCoords.ymax / rsdm.hCoords.ygap)
+    offset = int((rsdm.hCoords.xmax - rsdm.hCoords.xmin) / (2 * rsdm.hCoords.xgap))
+    nz = min(zc + 1, rows)
+    nx = cols - offset
+
+    Zh = rsdm.hCoords.ygap * np.arange(nz)[:, np.newaxis]
+    Xh = rsdm.hCoords.xgap * np.arange(nx)
+
+    for metline in met:
+        Uz, H, Q, Xf = plume_params(rsdm, rsdm.source, metline, ambient_temp)
+        if Uz <= 0.5:
+            continue
+
+        xx = (Xh - Xf) / 1000  # Включает коррекцию подъема дымовой трубы
+        conc = C_array(xx, 0.0, Zh, Uz, Q, H, metline.pgcat) / metline.hours
+        rsdm.hGrid[zc - np.arange(nz)[:, np.newaxis], offset + np.arange(nx)] += conc
+
+
+# Concentrations at receptor points Xr, Yr (m, the frame of the source positions) and height Zr,
+# as a sources x receptors matrix; no grid is involved. Sources with identical plume parameters
+# are evaluated together in one C_array call.
+
+def iter_points(rsdm, met, ambient_temp, Xr, Yr, Zr=0.0):
+    Xr = np.asarray(Xr, dtype=np.float64).ravel()
+    Yr = np.asarray(Yr, dtype=np.float64).ravel()
+    conc = np.zeros((len(rsdm.sources), Xr.size))
+
+    sx = np.array([source.x for source in rsdm.sources], dtype=np.float64)[:, np.newaxis]
+    sy = np.array([source.y for source in rsdm.sources], dtype=np.float64)[:, np.newaxis]
+    stacks = source_arrays(rsdm.sources)
+
+    for metline in met:
+        sinPHI = np.sin(metline.phi)
+        cosPHI = np.cos(metline.phi)
+
+        for indices, (Uz, H, Q, Xf) in plume_params_array(rsdm, stacks, metline, ambient_temp):
+            if Uz <= 0.5:
+                continue
+
+            dx = Xr - sx[indices]
+            dy = Yr - sy[indices]
+            xx = (-1 * dx * sinPHI - dy * cosPHI) / 1000 - Xf / 1000  # Коррекция подъема дымовой трубы
+            yy = dx * cosPHI - dy * sinPHI
+            conc[indices] += C_array(xx, yy, Zr, Uz, Q, H, metline.pgcat) / metline.hours
+
+    return conc
@@ -0,0 +1,21 @@
+import numpy as np
+
+# Equirectangular projection around a reference point, accurate enough
+# for a city-sized domain.
+METRES_PER_DEGREE = 111320
+
+
+def to_local(lat, lon, center_lat, center_lon):
+    x = (np.asarray(lon) - center_lon) * METRES_PER_DEGREE * np.cos(np.radians(center_lat))
+    y = (np.asarray(lat) - center_lat) * METRES_PER_DEGREE
+    return x, y
+
+
+def to_lonlat(x, y, center_lat, center_lon):
+    lon = center_lon + np.asarray(x) / (METRES_PER_DEGREE * np.cos(np.radians(center_lat)))
+    lat = center_lat + np.asarray(y) / METRES_PER_DEGREE
+    return lon, lat
+
+
+def bbox_center(lats, lons):
+    return (np.min(lats) + np.max(lats)) / 2, (np.min(lons) + np.max(lons)) / 2
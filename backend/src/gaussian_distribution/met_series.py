@@ -0,0 +1,71 @@
+import csv
+import itertools
+from pathlib import Path
+
+# Hourly meteorological series for long-term averaging (RSDM.run_series).
+# One record per hour with the columns:
+#   wind_speed      - wind speed at 10 m (m/s)
+#   wind_direction  - direction the wind blows from (degrees)
+#   temperature     - ambient temperature (°C)
+#   pgcat           - Pasquill-Gifford stability class, A..F
+# Other columns (e.g. a timestamp) are ignored. CSV is read with the standard library,
+# Parquet requires pyarrow.
+
+COLUMNS = ("wind_speed", "wind_direction", "temperature", "pgcat")
+PGCATS = ("A", "B", "C", "D", "E", "F")
+BATCH_SIZE = 744  # Часов в пакете (месяц)
+
+
+def parse_record(row):
+    pgcat = str(row["pgcat"]).strip().upper()
+    if pgcat not in PGCATS:
+        raise ValueError(f"Unknown stability class: {row['pgcat']!r}")
+
+    return (
+        float(row["wind_speed"]),
+        float(row["wind_direction"]) % 360,
+        float(row["temperature"]),
+        pgcat,
+    )
+
+
+def iter_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        missing = set(COLUMNS) - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"{path}: missing met series columns {sorted(missing)}")
+
+        for row in reader:
+            yield parse_record(row)
+
+
+def iter_parquet(path, batch_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Reading Parquet met series requires pyarrow") from e
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=list(COLUMNS)):
+        columns = batch.to_pydict()
+        for row in zip(*(columns[name] for name in COLUMNS)):
+            yield parse_record(dict(zip(COLUMNS, row)))
+
+
+# Records (wind_speed, wind_direction, temperature, pgcat) in lists of at most batch_size,
+# so memory does not depend on the length of the series.
+def read_met_series(path, batch_size=BATCH_SIZE):
+    path = Path(path)
+    if path.suffix.lower() in (".parquet", ".pq"):
+        records = iter_parquet(path, batch_size)
+    else:
+        records = iter_csv(path)
+
+    while batch := list(itertools.islice(records, batch_size)):
+        yield batch
+
+
+def met_series_signature(path):
+    # Файл серии определяет результат вместо текущей погоды
+    stat = Path(path).stat()
+    return {"path": str(path), "size": stat.st_size, "mtime": stat.st_mtime_ns}
@@ -0,0 +1,72 @@
+import math
+from numba import njit, prange
+
+# JIT-compiled counterparts of the dispersion formulas in disperse.py.
+# Compiled machine code is cached on disk (cache=True), so a restarted worker
+# loads it instead of compiling again. error_model="numpy" makes divisions by
+# zero produce inf/nan like NumPy does instead of raising.
+
+
+# Piecewise sigma_z lookup over a branch table (see disperse.sigma_z_tables).
+# The last bound of every table is inf, so the scan always terminates.
+@njit(cache=True, error_model="numpy")
+def sigma_z(x, bounds, a, b, cap):
+    branch = 0
+    while x > bounds[branch]:
+        branch += 1
+
+    sz = a[branch] * x ** b[branch]
+    return min(sz, cap)
+
+
+@njit(cache=True, error_model="numpy")
+def sigma_y(x, c, d):
+    theta = 0.017453293 * (c - d * math.log(x))
+    return 465.11628 * x * math.tan(theta)
+
+
+# Receptors further than cutoff * sigma_y from the centreline are skipped (cutoff=inf disables it).
+@njit(cache=True, error_model="numpy")
+def conc(x, y, z, Uz, Q, H, cutoff, c, d, bounds, a, b, cap):
+    # Концентрация вверх по потоку всегда равна нулю
+    if x <= 0:
+        return 0.0
+
+    Sy = sigma_y(x, c, d)
+    if abs(y) > cutoff * abs(Sy):
+        return 0.0
+
+    Sz = sigma_z(x, bounds, a, b, cap)
+
+    Sz2 = 2 * Sz * Sz
+    Sy2 = 2 * Sy * Sy
+
+    c1 = Q / (2 * math.pi * Uz * Sy * Sz)
+    c2 = math.exp(-1 * (z - H) ** 2 / Sz2)
+    c3 = math.exp(-1 * (z + H) ** 2 / Sz2)
+    c4 = math.exp(-1 * y ** 2 / Sy2)
+
+    value = c1 * (c2 + c3) * c4  # г/м3
+    if not math.isfinite(value):
+        return 0.0
+    return value
+
+
+# Plan grid at ground level; row 0 corresponds to ymax. Rows are split across threads.
+# Only cells of tiles marked in the wedge mask (tile x tile cells each) are evaluated.
+@njit(parallel=True, cache=True, error_model="numpy")
+def plan_grid(grid, tiles, tile, xmin, ymin, xgap, ygap, sx, sy, sinPHI, cosPHI, Xf,
+              Uz, Q, H, hours, cutoff, c, d, bounds, a, b, cap):
+    rows, cols = grid.shape
+
+    for row in prange(rows):
+        Yr = ymin + ygap * (rows - 1 - row) - sy
+        for tile_col in range(tiles.shape[1]):
+            if not tiles[row // tile, tile_col]:
+                continue
+
+            for col in range(tile_col * tile, min((tile_col + 1) * tile, cols)):
+                Xr = xmin + xgap * col - sx
+                xx = (-1 * Xr * sinPHI - Yr * cosPHI) / 1000 - Xf / 1000
+                yy = Xr * cosPHI - Yr * sinPHI
+                grid[row, col] += conc(xx, yy, 0.0, Uz, Q, H, cutoff, c, d, bounds, a, b, cap) / hours
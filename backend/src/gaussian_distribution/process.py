@@ -3,24 +3,42 @@ import numpy as np
 import requests
 from tqdm import tqdm
 from loguru import logger
-from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
 from numba import njit
 
 import geojson
+import shapely
+import contourpy
 from shapely.geometry import MultiPolygon, Polygon
 from shapely.ops import unary_union
 
 from .. import config as cfg
-from .rsdm import RSDM
+from .. import metrics
+from .geo import METRES_PER_DEGREE, bbox_center, to_local, to_lonlat
+from .rsdm import RSDM, GridBuffers, grid_quality
+from .disperse import dispersion_backends
+from .result_cache import weather_signature
+from .met_series import met_series_signature, read_met_series
+from .weather import fallback_weather, parse_weather
+from .visualise import band_colours
 
 
 class GeoJSONGenerator:
-    def __init__(self, img_data, center_lat, center_lon):
+    # Допуск упрощения полигонов в метрах (0.0001 градуса широты)
+    simplify_tolerance = 0.0001 * METRES_PER_DEGREE
+
+    # Масштабы карты, для которых строятся упрощённые наборы полигонов (уровни детализации)
+    lod_zooms = tuple(cfg.GEOJSON_LOD_ZOOMS)
+
+    def __init__(self, img_data, cell_size=1):
+        # img_data - RGBA изображение или двумерный массив индексов полос (uint8)
         self.img_data = img_data
-        self.center_lat = center_lat
-        self.center_lon = center_lon
-        self.cell_size_lat = 1 / 111320
-        self.cell_size_lon = 1 / (111320 * np.cos(np.radians(center_lat)))
+        # cell_size - размер пикселя изображения в метрах
+        self.cell_size = cell_size
+        self.band_polygons = None
+        # Области концентраций не ниже каждой группы до упрощения и наборы, упрощённые по масштабам карты
+        self.band_regions = None
+        self.lod_polygons = None
 
     @staticmethod
     @njit
@@ -28,114 +46,213 @@ class GeoJSONGenerator:
         max_value = 255
         return np.clip((color_values / max_value) * 8, 0, 7).astype(np.int32)
 
-    def create_geojson_from_img_data(self):
-        rows, cols = self.img_data.shape[0:2]
-        
-        # Получаем цветовые значения и рассчитываем индексы групп
-        color_values = self.img_data[:, :, 0]
-        group_indices = self.calculate_group_indices(color_values)
-
-        # Инициализируем массивы для хранения полигонов по группам
-        polygons_by_group = [[] for _ in range(8)]
-
-        # Генерируем полигоны для всех пикселей без использования tqdm
-        for y in range(rows):
-            for x in range(cols):
-                if np.sum(self.img_data[y, x]) != (255 + 255 + 255 + 255):
-                    lat_min = self.center_lat + (rows / 2 - y) * self.cell_size_lat
-                    lat_max = self.center_lat + (rows / 2 - (y + 1)) * self.cell_size_lat
-                    lon_min = self.center_lon + (x - cols / 2) * self.cell_size_lon
-                    lon_max = self.center_lon + (x - cols / 2 + 1) * self.cell_size_lon
-
-                    polygon = Polygon([
-                        (lon_min, lat_min),
-                        (lon_max, lat_min),
-                        (lon_max, lat_max),
-                        (lon_min, lat_max),
-                        (lon_min, lat_min),
-                    ])
-
-                    group_index = group_indices[y, x]
-                    polygons_by_group[group_index].append(polygon)
-
-        features = []
-        
-        # Обработка полигонов по группам с использованием многопоточности
-        with ThreadPoolExecutor() as executor:
-            futures = {executor.submit(self.process_polygons, group_index, polygons): group_index 
-                       for group_index, polygons in enumerate(polygons_by_group) if polygons}
-
-            for future in futures:
-                features.extend(future.result())
+    @classmethod
+    def band_groups(cls):
+        # Индекс группы для каждой полосы, полоса 0 (пусто) - -1
+        groups = cls.calculate_group_indices(band_colours[:, 0])
+        groups[0] = -1
+        return groups
+
+    def create_band_polygons(self):
+        # Получаем цветовые значения и рассчитываем индексы групп, пустые (белые) пиксели - -1
+        if self.img_data.ndim == 2:
+            group_indices = self.band_groups()[self.img_data]
+        else:
+            color_values = self.img_data[:, :, 0]
+            group_indices = self.calculate_group_indices(color_values)
+            group_indices[np.all(self.img_data == 255, axis=2)] = -1
+
+        # Контуры каждой группы строятся по её маске, поэтому полигоны групп не пересекаются
+        with metrics.stage("trace_polygons"):
+            polygons_by_group = [self.trace_group(group_indices, group_index) for group_index in range(8)]
+
+        band_unions = []
+        band_polygons = []
+        with metrics.stage("union_simplify"):
+            for group_index, polygons in enumerate(polygons_by_group):
+                if polygons:
+                    merged_polygon = unary_union(polygons)
+                    band_unions.append((group_index, merged_polygon))
+                    band_polygons.extend((group_index, polygon) for polygon in self.process_polygons(merged_polygon))
+
+        with metrics.stage("lod_simplify"):
+            # Группа 0 - наибольшие концентрации, поэтому области групп 0..g вложены друг в друга
+            band_regions = []
+            region = None
+            for group_index, merged_polygon in band_unions:
+                region = merged_polygon if region is None else unary_union([region, merged_polygon])
+                band_regions.append((group_index, region))
+
+            self.band_regions = band_regions
+            self.lod_polygons = {zoom: self.simplify_bands(self.lod_tolerance(zoom)) for zoom in self.lod_zooms}
+
+        self.band_polygons = band_polygons
+        return band_polygons
+
+    @classmethod
+    def lod_tolerance(cls, zoom):
+        # Половина пикселя тайла Web Mercator на экваторе (м), но не меньше полного допуска
+        return max(cls.simplify_tolerance, 0.5 * 40075016.686 / 256 / 2 ** zoom)
+
+    def simplify_bands(self, tolerance):
+        # Вложенные области упрощаются от внешней к внутренней, каждая обрезается по упрощённой
+        # объемлющей; полосы - разности соседних областей, поэтому их общие границы совпадают
+        # без зазоров и наложений. Части и дыры меньше четверти пикселя (tolerance^2) отбрасываются
+        min_area = tolerance ** 2
+        regions = []
+        outer = None
+        for group_index, region in reversed(self.band_regions):
+            region = self.drop_small(region, min_area).simplify(tolerance, preserve_topology=True)
+            if outer is not None:
+                region = region.intersection(outer)
+            regions.append((group_index, region))
+            outer = region
+
+        band_polygons = []
+        inner = None
+        for group_index, region in reversed(regions):
+            band = region if inner is None else region.difference(inner)
+            inner = region
+            band_polygons.extend(
+                (group_index, polygon) for polygon in shapely.get_parts(band)
+                if isinstance(polygon, Polygon) and not polygon.is_empty
+            )
+
+        return band_polygons
 
+    @staticmethod
+    def drop_small(geometry, min_area):
+        polygons = []
+        for polygon in shapely.get_parts(geometry):
+            if not isinstance(polygon, Polygon) or polygon.area < min_area:
+                continue
+            holes = [ring for ring in polygon.interiors if Polygon(ring).area >= min_area]
+            polygons.append(Polygon(polygon.exterior, holes))
+
+        return MultiPolygon(polygons)
+
+    def create_geojson_from_img_data(self, center_lat, center_lon, zoom=None):
+        # Полигоны строятся в метрах один раз, для каждого центра выполняется только проекция.
+        # zoom - один из lod_zooms для упрощённого набора, None - полная детализация
+        if self.band_polygons is None:
+            self.create_band_polygons()
+        band_polygons = self.band_polygons if zoom is None else self.lod_polygons[zoom]
+
+        def project(coords):
+            return np.column_stack(to_lonlat(coords[:, 0], coords[:, 1], center_lat, center_lon))
+
+        features = [
+            self.polygon_feature(shapely.transform(polygon, project), group_index, self.get_color_by_area(group_index))
+            for group_index, polygon in band_polygons
+        ]
         return geojson.FeatureCollection(features)
 
-    def process_polygons(self, group_index, polygons):
-        merged_polygon = unary_union(polygons)
+    def trace_group(self, group_indices, group_index):
+        rows, cols = group_indices.shape
+        mask = group_indices == group_index
+
+        # Ограничиваем обработку окном вокруг пикселей группы
+        mask_rows = np.flatnonzero(mask.any(axis=1))
+        mask_cols = np.flatnonzero(mask.any(axis=0))
+        if len(mask_rows) == 0:
+            return []
+
+        row_min, row_max = mask_rows[0], mask_rows[-1]
+        col_min, col_max = mask_cols[0], mask_cols[-1]
+
+        # Рамка из нулей замыкает контуры на краях окна
+        window = np.pad(mask[row_min:row_max + 1, col_min:col_max + 1], 1).astype(np.float64)
+        px = col_min - 1 + np.arange(window.shape[1]) + 0.5
+        py = row_min - 1 + np.arange(window.shape[0]) + 0.5
+
+        # Граница уровня 0.5 между центрами пикселей проходит по их краям
+        generator = contourpy.contour_generator(px, py, window, fill_type=contourpy.FillType.OuterOffset)
+        points_list, offsets_list = generator.filled(0.5, 1.5)
+
+        # Координаты в метрах относительно центра изображения (y направлен на север)
+        polygons = []
+        for points, offsets in zip(points_list, offsets_list):
+            x = (points[:, 0] - cols / 2) * self.cell_size
+            y = (rows / 2 - points[:, 1]) * self.cell_size
+            rings = np.split(np.column_stack((x, y)), offsets[1:-1])
+            polygons.append(Polygon(rings[0], rings[1:]))
 
+        return polygons
+
+    def process_polygons(self, merged_polygon):
         if isinstance(merged_polygon, (Polygon, MultiPolygon)):
-            merged_polygon = merged_polygon.simplify(0.0001, preserve_topology=True)
-            color = self.get_color_by_area(group_index)
+            merged_polygon = merged_polygon.simplify(self.simplify_tolerance, preserve_topology=True)
 
             if isinstance(merged_polygon, MultiPolygon):
-                return [geojson.Feature(
-                            geometry=geojson.Polygon([list(poly.exterior.coords)]),
-                            properties={"group": group_index, "color": color}
-                        ) for poly in merged_polygon.geoms]
+                return list(merged_polygon.geoms)
             elif isinstance(merged_polygon, Polygon):
-                return [geojson.Feature(
-                            geometry=geojson.Polygon([list(merged_polygon.exterior.coords)]),
-                            properties={"group": group_index, "color": color}
-                        )]
+                return [merged_polygon]
 
         return []
 
-    def get_color_by_area(self, group):
+    @staticmethod
+    def polygon_feature(polygon, group_index, color):
+        rings = [list(polygon.exterior.coords)] + [list(ring.coords) for ring in polygon.interiors]
+        return geojson.Feature(
+            geometry=geojson.Polygon(rings),
+            properties={"group": group_index, "color": color}
+        )
+
+    @staticmethod
+    def get_color_by_area(group):
         r = int(255 * (1 - (group) / 8))
         g = int(255 * (group / 8))
         return r, g, 0
 
 
+class BandField:
+    # Растр индексов полос, размер его пикселя в метрах и центры (lat, lon),
+    # в которых растр размещён на карте. При нескольких растрах (предприятия с разными трубами)
+    # bands имеет форму (растры, строки, столбцы), а layers - номер растра для каждого центра
+    def __init__(self, bands, cell_size, centres, layers=None):
+        self.bands = bands
+        self.cell_size = cell_size
+        self.centres = centres
+        self.layers = layers
+
+    def sample(self, lat, lon):
+        # Наибольшая полоса среди всех размещений растра в точках (lat, lon)
+        rows, cols = self.bands.shape[-2:]
+        result = np.zeros(np.shape(lat), dtype=np.uint8)
+
+        half_lat = rows / 2 * self.cell_size / METRES_PER_DEGREE
+        for index, (center_lat, center_lon) in enumerate(self.centres):
+            bands = self.bands if self.layers is None else self.bands[self.layers[index]]
+
+            # Пропускаем размещения, не пересекающиеся с областью запроса
+            half_lon = cols / 2 * self.cell_size / (METRES_PER_DEGREE * np.cos(np.radians(center_lat)))
+            if (np.max(lat) < center_lat - half_lat or np.min(lat) > center_lat + half_lat
+                    or np.max(lon) < center_lon - half_lon or np.min(lon) > center_lon + half_lon):
+                continue
+
+            x, y = to_local(lat, lon, center_lat, center_lon)
+            col = np.floor(x / self.cell_size + cols / 2).astype(np.intp)
+            row = np.floor(rows / 2 - y / self.cell_size).astype(np.intp)
+
+            inside = (col >= 0) & (col < cols) & (row >= 0) & (row < rows)
+            result[inside] = np.maximum(result[inside], bands[row[inside], col[inside]])
+
+        return result
+
+
 class WeatherChecker:
     def __init__(self):
         self.weather_data = None
 
     def fetch_weather(self):
-        response = requests.get(cfg.API_OPENWEATHERMAP_URL)
-
-        if response.status_code == 200:
-            weather_data = response.json()
-            temperature = weather_data['main']['temp']
-            temperature_min = weather_data['main']['temp_min'] + 273.15
-            temperature_max = weather_data['main']['temp_max'] + 273.15
-            wind_direction = weather_data['wind']['deg']
-            wind_speed = weather_data['wind']['speed']
-            humidity = weather_data['main']['humidity']
-            clouds = weather_data['clouds']['all']
-            weather_conditions = [w['main'] for w in weather_data['weather']]
-            
-            result = {
-                'temperature': temperature,
-                'temperature_min': temperature_min,
-                'temperature_max': temperature_max,
-                'humidity': humidity,
-                'wind_direction': wind_direction,
-                'wind_speed': wind_speed,
-                'clouds': clouds,
-                'weather_conditions': weather_conditions
-            }
-            self.weather_data = result
-        else:
-            self.weather_data = {
-                'temperature': 0,
-                'temperature_min': 0,
-                'temperature_max': 0,
-                'humidity': 70,
-                'wind_direction': 0,
-                'wind_speed': 0,
-                'clouds': 0,
-                'weather_conditions': []
-            }
+        # Синхронный запрос; сервер получает погоду через weather.WeatherProvider
+        try:
+            response = requests.get(cfg.API_OPENWEATHERMAP_URL, timeout=cfg.WEATHER_TIMEOUT)
+            response.raise_for_status()
+            self.weather_data = parse_weather(response.json())
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logger.warning(f"Weather unavailable, using calm fallback: {e!r}")
+            self.weather_data = dict(fallback_weather)
 
     def check_conditions(self):
         temp = self.weather_data["temperature"]
@@ -183,41 +300,380 @@ class WeatherChecker:
 
 
 class GeoJSONApp:
-    def __init__(self, img_data_path="factory.json"):
+    # "per_factory" - один факел в начале координат, наложенный на каждое предприятие
+    # "superposed" - все предприятия на общей сетке, концентрации суммируются
+    modes = ("per_factory", "superposed")
+
+    # Параметры источника и области расчёта, общие для всех предприятий
+    model_params = dict(
+        source_elevation=60,
+        source_diameter=2.5,
+        source_velocity=17.5,
+        x_length=50_000,
+        y_length=50_000,
+        adaptive=cfg.MODEL_ADAPTIVE,
+        backend=cfg.MODEL_BACKEND,
+    )
+
+    # Свойства предприятия в factory.json -> параметры трубы RSDM; отсутствующие берутся из model_params
+    stack_properties = {
+        "stack_height": "source_elevation",        # м
+        "stack_diameter": "source_diameter",       # м
+        "exit_velocity": "source_velocity",        # м/с
+        "exit_temperature": "source_temperature",  # °C
+        "emission_rate": "source_emission",        # г/с
+    }
+
+    # Источник погоды для fetch_weather (подменяется, например, в бенчмарках)
+    weather_checker_class = WeatherChecker
+
+    def __init__(self, img_data_path="factory.json", mode="per_factory", result_cache=None, pool=None,
+                 met_series=None, prepare=None):
+        if mode not in self.modes:
+            raise ValueError(f"Unknown model mode: {mode!r}")
+        # Бэкенд проверяется при запуске сервера, а не при первом расчёте в процессе модели
+        if self.model_params["backend"] not in dispersion_backends:
+            raise ValueError(f"Unknown dispersion backend: {self.model_params['backend']!r}")
+
+        self.mode = mode
         with open(img_data_path, "r") as f:
             self.geojson_data = json.load(f)
 
-    def run(self):
-        weather_checker = WeatherChecker()
-        weather_checker.fetch_weather()
-        results_cat = weather_checker.check_conditions()
-
-        model = RSDM(
+        # Метеоусловия последнего запуска
+        self.weather_checker = None
+        self.results_cat = None
+
+        # Результаты прошлых запусков по квантованной погоде (ResultCache или None)
+        self.result_cache = result_cache
+
+        # Пул процессов для расчёта модели (ProcessPoolExecutor или None - расчёт в текущем процессе)
+        self.pool = pool
+
+        # Файл почасовой метеосерии: карта строится по средней концентрации за серию, а не по текущей погоде
+        self.met_series = met_series
+
+        # prepare(geojson, lods) -> готовые ответы API по результату (cfg.MODEL_RELEASE); вызывается
+        # в процессе расчёта, чтобы сериализация и сжатие не занимали GIL процесса API
+        self.prepare = prepare
+
+        # Плановые сетки, переиспользуемые последовательными запусками модели
+        self.grid_buffers = GridBuffers()
+
+    def factory_stacks(self):
+        # Параметры трубы каждого предприятия, заданные в его свойствах
+        stacks = []
+        for feature in self.geojson_data["features"]:
+            properties = feature.get("properties") or {}
+            stacks.append({
+                param: float(properties[name])
+                for name, param in self.stack_properties.items()
+                if properties.get(name) is not None
+            })
+        return stacks
+
+    def __getstate__(self):
+        # В процесс расчёта передаются параметры модели, предприятия и кэш результатов (каталог на диске)
+        state = self.__dict__.copy()
+        state.update(pool=None, weather_checker=None, grid_buffers=None)
+        return state
+
+    def signature(self, weather_checker, results_cat, quality="High"):
+        if self.met_series is not None:
+            weather = met_series_signature(self.met_series)
+        else:
+            weather = weather_signature(weather_checker.weather_data, results_cat)
+
+        return {
+            "weather": weather,
+            "quality": quality,
+            "cell_size": grid_quality[quality],  # м, размер пикселя полигонов и растра полос
+            "mode": self.mode,
+            "model": self.model_params,
+            "factories": [feature["geometry"]["coordinates"] for feature in self.geojson_data["features"]],
+            "stacks": self.factory_stacks(),
+            "lod_zooms": list(GeoJSONGenerator.lod_zooms),
+        }
+
+    def build_model(self, weather_checker, results_cat, **kwargs):
+        return RSDM(
             wspd=weather_checker.weather_data["wind_speed"],
             wdir=weather_checker.weather_data["wind_direction"],
             ambient_temp=weather_checker.weather_data["temperature"],
             pgcat=results_cat,
-            source_elevation=60,
-            source_diameter=2.5,
-            source_velocity=17.5,
-            x_length=50_000,
-            y_length=50_000,
+            **{**self.model_params, **kwargs}
         )
 
-        model.run_model()
-        data = model.update_image()
+    def fetch_weather(self, weather_data=None):
+        # weather_data - уже полученная погода (WeatherProvider.fetch), иначе запрос выполняется здесь
+        weather_checker = self.weather_checker_class()
+        if weather_data is None:
+            weather_checker.fetch_weather()
+        else:
+            weather_checker.weather_data = weather_data
+
+        self.weather_checker = weather_checker
+        self.results_cat = weather_checker.check_conditions()
+
+    def cache_key(self, quality="High"):
+        if self.result_cache is None:
+            return None
+
+        return self.result_cache.key(self.signature(self.weather_checker, self.results_cat, quality))
+
+    def cached(self, quality="High"):
+        key = self.cache_key(quality)
+        if key is None:
+            return None, None
+
+        return key, self.result_cache.get(key)
+
+    def run_progressive(self, qualities, publish=None, weather_data=None):
+        # Сначала публикуется грубый результат, затем каждая следующая стадия заменяет предыдущую
+        self.fetch_weather(weather_data)
+
+        # Если итоговый результат уже в кэше, грубые стадии не нужны
+        key = self.cache_key(qualities[-1])
+        if key is not None and self.result_cache.contains(key):
+            qualities = qualities[-1:]
+
+        for quality in qualities:
+            self.run(quality, refresh=False)
+            if publish is not None:
+                publish()
+
+    def run(self, quality="High", refresh=True):
+        if refresh or self.weather_checker is None:
+            self.fetch_weather()
+
+        # Расчёт и подготовка ответов в отдельном процессе не конкурируют с API за GIL;
+        # растр и готовые байты ответов возвращаются через разделяемую память
+        if self.pool is not None:
+            future = self.pool.submit(produce_model, self, self.weather_checker.weather_data, self.results_cat, quality)
+            bands, cell_size, centres, layers, release, stages = future.result()
+            for name, seconds in stages:
+                metrics.observe_stage(name, seconds)
+            field, release = BandField(receive_array(bands), cell_size, centres, layers), receive(release)
+        else:
+            field, release = self.produce(quality)
 
-        all_geojson_data = []
+        cfg.MODEL_FIELD = field
+        cfg.MODEL_RELEASE = release
+        cfg.MODEL_QUALITY = quality
+        cfg.MODEL_VERSION += 1
 
-        def process_feature(feature):
-            coordinates = feature["geometry"]["coordinates"][::-1]
-            generator = GeoJSONGenerator(data, coordinates[0], coordinates[1])
-            return generator.create_geojson_from_img_data()
+    def produce(self, quality="High"):
+        # Результат из кэша или нового расчёта и подготовленные по нему ответы API
+        key, cached = self.cached(quality)
 
-        # Используем ThreadPoolExecutor для распараллеливания
-        with ThreadPoolExecutor() as executor:
-            all_geojson_data = list(tqdm(executor.map(process_feature, self.geojson_data["features"]), total=len(self.geojson_data["features"])))
+        if cached is not None:
+            logger.info(f"Model result cache hit {key}, skipping dispersion run")
+            all_geojson_data, lods, bands, cell_size, centres, layers = cached
+            field = BandField(bands, cell_size, centres, layers)
+        else:
+            all_geojson_data, lods, field = self.compute(self.weather_checker, self.results_cat, quality)
+
+            if key is not None:
+                self.result_cache.put(
+                    key, all_geojson_data, lods, field.bands, field.cell_size, field.centres, field.layers
+                )
+
+        release = self.prepare(all_geojson_data, lods) if self.prepare is not None else None
+        return field, release
+
+    def compute(self, weather_checker, results_cat, quality="High"):
+        if self.mode == "superposed":
+            return self.run_superposed(weather_checker, results_cat, quality)
+        return self.run_per_factory(weather_checker, results_cat, quality)
+
+    def run_dispersion(self, model):
+        if self.met_series is None:
+            with metrics.stage("run_model"):
+                model.run_model()
+            return
+
+        with metrics.stage("run_model"):
+            hours = model.run_series(read_met_series(self.met_series))
+        logger.info(f"Averaged {hours} hours of {self.met_series}")
+
+    def point_concentrations(self, lats, lons):
+        # Концентрации в точках (lat, lon) от каждого предприятия по погоде последнего запуска,
+        # матрица (предприятия, точки); сетка расчёта не строится (x_length=y_length=0)
+        if self.weather_checker is None:
+            return None
+
+        factory_lons, factory_lats = np.array([feature["geometry"]["coordinates"] for feature in self.geojson_data["features"]]).T
+        center_lat, center_lon = bbox_center(factory_lats, factory_lons)
+        xs, ys = to_local(factory_lats, factory_lons, center_lat, center_lon)
+        x, y = to_local(lats, lons, center_lat, center_lon)
+
+        model = self.build_model(
+            self.weather_checker, self.results_cat,
+            source_positions=list(zip(xs, ys)), source_stacks=self.factory_stacks(), x_length=0, y_length=0,
+        )
+        return model.point_concentrations(x, y)
+
+    def cross_section(self, factory_index, azimuth):
+        # Вертикальный срез факела предприятия вдоль азимута (целые градусы) по метеоусловиям
+        # последнего запуска; срезы кэширует API (api/cross_section.py)
+        if self.weather_checker is None:
+            return None
+
+        azimuth = round(azimuth) % 360
+        # Плановая сетка срезу не нужна
+        model = self.build_model(
+            self.weather_checker, self.results_cat, x_length=0, y_length=0,
+            **self.factory_stacks()[factory_index],
+        )
+        grid = model.cross_section(azimuth)
+
+        return {
+            "factory": factory_index,
+            "azimuth": azimuth,
+            "distance": [model.hCoords.xmin + model.hCoords.xgap * i for i in range(grid.shape[1])],
+            "height": [model.hCoords.ymax - model.hCoords.ygap * i for i in range(grid.shape[0])],
+            "grid": grid.tolist(),
+        }
+
+    def run_superposed(self, weather_checker, results_cat, quality="High"):
+        # Предприятия проецируются на общую сетку вокруг центра их охвата
+        lons, lats = np.array([feature["geometry"]["coordinates"] for feature in self.geojson_data["features"]]).T
+        center_lat, center_lon = bbox_center(lats, lons)
+        xs, ys = to_local(lats, lons, center_lat, center_lon)
+
+        model = self.build_model(
+            weather_checker, results_cat,
+            source_positions=list(zip(xs, ys)), source_stacks=self.factory_stacks(),
+            quality=quality, grid_buffers=self.grid_buffers,
+        )
+        self.run_dispersion(model)
+        logger.debug(f"Plume wedge cutoff: {model.sigma_cutoff} sigma_y, truncated mass <= {model.truncated_mass:.1e}")
+        with metrics.stage("update_image"):
+            data = model.update_image(rgba=False)
+
+        generator = GeoJSONGenerator(data, cell_size=model.grid)
+        generator.create_band_polygons()
+        with metrics.stage("project_polygons"):
+            all_geojson_data = [generator.create_geojson_from_img_data(center_lat, center_lon)]
+            lods = {
+                zoom: [generator.create_geojson_from_img_data(center_lat, center_lon, zoom)]
+                for zoom in generator.lod_zooms
+            }
+
+        return all_geojson_data, lods, BandField(data, model.grid, [(center_lat, center_lon)])
+
+    def run_per_factory(self, weather_checker, results_cat, quality="High"):
+        # Факел рассчитывается один раз для каждого набора параметров трубы,
+        # предприятия с одинаковыми трубами используют общий результат
+        stacks = self.factory_stacks()
+        groups = {}
+        for index, stack in enumerate(stacks):
+            groups.setdefault(tuple(sorted(stack.items())), []).append(index)
+
+        generators = {}
+        layers = {}
+        rasters = []
+        for stack in groups:
+            model = self.build_model(
+                weather_checker, results_cat, quality=quality, grid_buffers=self.grid_buffers, **dict(stack)
+            )
+            self.run_dispersion(model)
+            logger.debug(f"Plume wedge cutoff: {model.sigma_cutoff} sigma_y, truncated mass <= {model.truncated_mass:.1e}")
+            with metrics.stage("update_image"):
+                data = model.update_image(rgba=False)
+
+            # Полигоны векторизуются один раз и переносятся на координаты каждого предприятия.
+            # Пиксель - ячейка сетки в метрах, как в режиме superposed, поэтому стадии разного качества совпадают
+            generator = GeoJSONGenerator(data, cell_size=model.grid)
+            generator.create_band_polygons()
+
+            generators[stack] = generator
+            layers[stack] = len(rasters)
+            rasters.append(data)
 
-        cfg.GEOJSON_DATA = all_geojson_data
-        with open(cfg.GEOJSON_PATH, 'w') as f:
-            f.write(json.dumps(all_geojson_data))
+        if len(groups) > 1:
+            logger.info(f"{len(stacks)} factories share {len(groups)} stack parameter sets")
+
+        all_geojson_data = []
+        lods = {zoom: [] for zoom in GeoJSONGenerator.lod_zooms}
+        centres = []
+        factory_layers = []
+        with metrics.stage("project_polygons"):
+            for feature, stack in zip(tqdm(self.geojson_data["features"]), stacks):
+                stack = tuple(sorted(stack.items()))
+                lon, lat = feature["geometry"]["coordinates"]
+                all_geojson_data.append(generators[stack].create_geojson_from_img_data(lat, lon))
+                for zoom, collections in lods.items():
+                    collections.append(generators[stack].create_geojson_from_img_data(lat, lon, zoom))
+                centres.append((lat, lon))
+                factory_layers.append(layers[stack])
+
+        if len(rasters) == 1:
+            return all_geojson_data, lods, BandField(rasters[0], generator.cell_size, centres)
+        return all_geojson_data, lods, BandField(np.stack(rasters), generator.cell_size, centres, factory_layers)
+
+
+# Массив передаётся между процессами через разделяемую память: отправитель копирует его
+# в сегмент и возвращает (имя, форма, тип), получатель копирует обратно и удаляет сегмент
+def share_array(array):
+    segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+    segment.close()
+    return segment.name, array.shape, array.dtype.str
+
+
+def receive_array(handle):
+    name, shape, dtype = handle
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=dtype, buffer=segment.buf).copy()
+    finally:
+        segment.close()
+        segment.unlink()
+
+
+# Сетки процесса расчёта живут между задачами, приложение приходит в каждой задаче заново
+worker_grid_buffers = GridBuffers()
+
+
+# Готовые ответы (словари и списки с bytes и массивами) передаются так же: bytes и массивы
+# через разделяемую память, остальное - вместе с результатом задачи
+class SharedValue:
+    def __init__(self, handle, as_bytes) -> None:
+        self.handle = handle
+        self.as_bytes = as_bytes
+
+
+def share(value):
+    if isinstance(value, bytes):
+        return SharedValue(share_array(np.frombuffer(value, dtype=np.uint8)), as_bytes=True)
+    if isinstance(value, np.ndarray):
+        return SharedValue(share_array(value), as_bytes=False)
+    if isinstance(value, dict):
+        return {key: share(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [share(item) for item in value]
+    return value
+
+
+def receive(value):
+    if isinstance(value, SharedValue):
+        array = receive_array(value.handle)
+        return array.tobytes() if value.as_bytes else array
+    if isinstance(value, dict):
+        return {key: receive(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [receive(item) for item in value]
+    return value
+
+
+# Точка входа процесса расчёта (см. GeoJSONApp.run)
+def produce_model(app, weather_data, results_cat, quality):
+    app.grid_buffers = worker_grid_buffers
+    app.weather_checker = app.weather_checker_class()
+    app.weather_checker.weather_data = weather_data
+    app.results_cat = results_cat
+
+    # Длительности стадий возвращаются вместе с результатом и учитываются в процессе API
+    with metrics.recording() as stages:
+        field, release = app.produce(quality)
+    return share_array(field.bands), field.cell_size, field.centres, field.layers, share(release), stages
@@ -0,0 +1,102 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+# Шаги квантования метеоусловий: близкая погода даёт один и тот же ключ
+WIND_SPEED_STEP = 0.5  # м/с
+WIND_DIRECTION_STEP = 5  # градусы
+TEMPERATURE_STEP = 1  # °C
+
+
+def quantize(value, step):
+    return round(round(value / step) * step, 6)
+
+
+def weather_signature(weather_data, pgcat):
+    return {
+        "wind_speed": quantize(weather_data["wind_speed"], WIND_SPEED_STEP),
+        "wind_direction": quantize(weather_data["wind_direction"] % 360, WIND_DIRECTION_STEP) % 360,
+        "temperature": quantize(weather_data["temperature"], TEMPERATURE_STEP),
+        "pgcat": pgcat,
+    }
+
+
+# Results of previous model runs on disk, one .npz file per signature.
+# Hits refresh the file's mtime; the oldest files are evicted beyond max_entries.
+class ResultCache:
+    def __init__(self, directory, max_entries=64):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(signature):
+        encoded = json.dumps(signature, sort_keys=True, separators=(",", ":"))
+        return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+
+    def path(self, key):
+        return self.directory / f"{key}.npz"
+
+    def contains(self, key):
+        # Проверка без чтения записи; mtime не обновляется, это делает get()
+        return self.enabled and self.path(key).exists()
+
+    def get(self, key):
+        # -> (geojson, lods, bands, cell_size, centres, layers) или None
+        if not self.enabled:
+            return None
+
+        path = self.path(key)
+        try:
+            with np.load(path) as entry:
+                result = (
+                    json.loads(entry["geojson"].tobytes().decode("utf-8")),
+                    {int(zoom): data for zoom, data in json.loads(entry["lods"].tobytes().decode("utf-8")).items()},
+                    entry["bands"],
+                    float(entry["cell_size"]),
+                    [tuple(centre) for centre in entry["centres"].tolist()],
+                    entry["layers"].tolist() if entry["layers"].size else None,
+                )
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Dropping unreadable result cache entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+        os.utime(path)
+        return result
+
+    def put(self, key, geojson_data, lods, bands, cell_size, centres, layers=None):
+        if not self.enabled:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        tmp = path.with_suffix(".tmp.npz")
+
+        # Запись через временный файл, чтобы прерванный процесс не оставил битую запись
+        np.savez_compressed(
+            tmp,
+            geojson=np.frombuffer(json.dumps(geojson_data).encode("utf-8"), dtype=np.uint8),
+            lods=np.frombuffer(json.dumps(lods).encode("utf-8"), dtype=np.uint8),
+            bands=bands,
+            cell_size=cell_size,
+            centres=np.asarray(centres, dtype=float).reshape(-1, 2),
+            layers=np.asarray(layers if layers is not None else [], dtype=np.intp),
+        )
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        entries = sorted(self.directory.glob("*.npz"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in entries[self.max_entries:]:
+            if not path.name.endswith(".tmp.npz"):
+                path.unlink(missing_ok=True)
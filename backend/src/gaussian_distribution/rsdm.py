@@ -1,8 +1,9 @@
 import math
 import numpy as np
-from typing import List
-from .disperse import iter_disp
-from .visualise import generate_png
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+from .disperse import iter_disp, iter_slice, iter_centreline, iter_points, dispersion_backends, wedge_truncation
+from .visualise import generate_bands, generate_png
 
 # Mapping of image quality selection to grid step (m)
 grid_quality = {
@@ -12,11 +13,12 @@ grid_quality = {
 }
 
 class HourMET:
-    def __init__(self, hours: int, u: float, phi: float, pgcat: str) -> None:
-        self.hours: int = hours
+    def __init__(self, hours: float, u: float, phi: float, pgcat: str, temp: Optional[float] = None) -> None:
+        self.hours: float = hours  # Divisor of the hour's concentration (hours averaged over)
         self.u: float = u
         self.phi: float = phi
         self.pgcat: str = pgcat
+        self.temp: Optional[float] = temp  # Ambient temperature (K), None - the model's ambient_temp
 
 class Grid:
     def __init__(self, xmin: int, xmax: int, ymin: int, ymax: int, xgap: int, ygap: int):
@@ -27,14 +29,53 @@ class Grid:
         self.xgap: int = xgap  # x step (m)
         self.ygap: int = ygap  # y step (m)
 
-    def generate_grid(self) -> List[List[int]]:
+    @property
+    def shape(self) -> Tuple[int, int]:
         cols = int((self.xmax - self.xmin) / self.xgap) + 1
         rows = int((self.ymax - self.ymin) / self.ygap) + 1
-        
-        grid = [[0 for _ in range(cols)] for _ in range(rows)]
+        return rows, cols
+
+    def generate_grid(self, dtype=np.float64, buffers: Optional["GridBuffers"] = None, name: str = "plan") -> np.ndarray:
+        if buffers is not None:
+            return buffers.get(self.shape, dtype, name)
+        return np.zeros(self.shape, dtype=dtype)
+
+
+# Grids kept between model runs, one per (name, shape, dtype), so repeated runs do not allocate.
+# Not thread-safe: a store must only be used by models that run one after another.
+class GridBuffers:
+    def __init__(self) -> None:
+        self.grids = {}
+
+    def get(self, shape, dtype, name: str = "plan") -> np.ndarray:
+        key = (name, tuple(shape), np.dtype(dtype).str)
+        grid = self.grids.get(key)
+        if grid is None:
+            grid = self.grids[key] = np.zeros(shape, dtype=dtype)
         return grid
 
 
+# Rows of a fine grid interpolated at once by prolong_add, bounding its temporaries
+PROLONG_ROWS = 512
+
+def prolong_add(coarse: np.ndarray, fine: np.ndarray, row0: int = 0, col0: int = 0, scale: float = 1.0) -> None:
+    # fine[i, j] += scale * P[row0 + i, col0 + j], where P is the bilinear interpolation of coarse
+    # onto the nodes of the level with half its step (same first node, row 0 at the top)
+    rows, cols = fine.shape
+    j = col0 + np.arange(cols)
+    left = j // 2
+    right = np.minimum(left + j % 2, coarse.shape[1] - 1)
+
+    top = row0 // 2
+    band = coarse[top:(row0 + rows) // 2 + 1]
+    across = (band[:, left] + band[:, right]) * (scale / 2)
+
+    i = row0 + np.arange(rows) - 2 * top
+    upper = i // 2
+    lower = np.minimum(upper + i % 2, across.shape[0] - 1)
+    fine += ((across[upper] + across[lower]) / 2).astype(fine.dtype, copy=False)
+
+
 class Source:
     def __init__(self, x: float, y: float, elevation: float, diameter: float, velocity: float, temp: float, emission: float) -> None:
         self.x: float = x                 # Stack x location (m)
@@ -54,25 +95,51 @@ class Source:
 class RSDM:
     __slots__ = (
         'grid', 'wspd', 'wdir', 'ambient_temp', 
-        'roughness', 'pgcat', 'source',
+        'roughness', 'pgcat', 'source', 'sources',
         'x_length', 'y_length', 'xmin', 'xmax',
-        'ymin', 'ymax', 'rCoords', 'rGrid', 'rDisp',
-        'hCoords', 'hGrid', 'hDisp'
+        'ymin', 'ymax', 'rCoords', 'rGrid',
+        'hCoords', 'hGrid', 'backend',
+        'sigma_cutoff', 'truncated_mass',
+        'adaptive', 'grid_buffers'
     )
 
-    rGrid: List[List[int]]
-    rDisp: List[List[int]]
-    hGrid: List[List[int]]
-    hDisp: List[List[int]]
+    # Plan grid precision: float32 halves the memory of the largest array, and its range
+    # covers every concentration band
+    grid_dtype = np.float32
+
+    # Half-width (m) of the finest nested level around each source in adaptive mode
+    nested_radius = 2500
+
+    rGrid: np.ndarray
+    hGrid: np.ndarray
 
     def __init__(self, wspd: float, wdir: float, ambient_temp: float, pgcat: str = "A", 
                 source_elevation: float = 60, source_diameter: float = 2.5,
                 source_velocity: float = 17.5, source_temperature: float = 200,
                 source_emission: float = 3.86,
-                x_length: int=5000, y_length: int=5000
+                x_length: int=5000, y_length: int=5000,
+                backend: str = "numpy",
+                source_positions: Optional[Sequence[Tuple[float, float]]] = None,
+                source_stacks: Optional[Sequence[Dict[str, float]]] = None,
+                sigma_cutoff: Optional[float] = 7.0,
+                quality: str = "High",
+                grid_buffers: Optional[GridBuffers] = None,
+                adaptive: bool = False
                 ) -> None:
-        
-        self.grid: int = grid_quality["High"]
+
+        if backend not in dispersion_backends:
+            raise ValueError(f"Unknown dispersion backend: {backend!r}")
+        if quality not in grid_quality:
+            raise ValueError(f"Unknown grid quality: {quality!r}")
+
+        self.grid: int = grid_quality[quality]
+        self.backend: str = backend
+
+        # Crosswind extent of the evaluated plume wedge in sigma_y (None evaluates every cell).
+        # At 7 sigma a skipped receptor holds under 1e-10 of the centreline concentration at the
+        # same distance, i.e. below the lowest visualised band.
+        self.sigma_cutoff: Optional[float] = sigma_cutoff
+        self.truncated_mass: float = 0.0
         self.wspd: float = wspd
         self.wdir: float = wdir
         self.roughness: str = "urban"
@@ -88,6 +155,36 @@ class RSDM:
             emission=source_emission
         )
 
+        # Stacks whose plumes are superposed on the plan grid (m, relative to the grid centre).
+        # By default a single stack sits at the origin. source_stacks, aligned with source_positions,
+        # overrides the source_* arguments for individual stacks.
+        self.sources: List[Source] = [self.source]
+        if source_positions is not None:
+            if source_stacks is None:
+                source_stacks = [{}] * len(source_positions)
+            if len(source_stacks) != len(source_positions):
+                raise ValueError("source_stacks must match source_positions")
+
+            defaults = dict(
+                source_elevation=source_elevation,
+                source_diameter=source_diameter,
+                source_velocity=source_velocity,
+                source_temperature=source_temperature,
+                source_emission=source_emission,
+            )
+            self.sources = []
+            for (x, y), stack in zip(source_positions, source_stacks):
+                stack = {**defaults, **stack}
+                self.sources.append(Source(
+                    x=x,
+                    y=y,
+                    elevation=stack["source_elevation"],
+                    diameter=stack["source_diameter"],
+                    velocity=stack["source_velocity"],
+                    temp=stack["source_temperature"],
+                    emission=stack["source_emission"]
+                ))
+
         self.ambient_temp: float = 273.15 + ambient_temp
         self.xmin: int = int(-(x_length / 2))
         self.xmax: int = int(x_length / 2)
@@ -96,50 +193,195 @@ class RSDM:
 
         # Setup x,y grid for plan view
         self.rCoords = Grid(self.xmin, self.xmax, self.ymin, self.ymax, self.grid, self.grid)
-        self.rGrid = self.rCoords.generate_grid()
-        self.rDisp = self.rCoords.generate_grid()
-        
-        # Setup x,z plane height plume cross-section view
+        self.rGrid = self.rCoords.generate_grid(self.grid_dtype, grid_buffers)
+        self.grid_buffers: Optional[GridBuffers] = grid_buffers
+
+        # Adaptive mode evaluates the plume on nested grids that coarsen away from the sources
+        # and resamples them to rGrid at the end (see nested_levels)
+        self.adaptive: bool = adaptive
+
+        # Setup x,z plane height plume cross-section view: the downwind centreline during a run
+        # (the reference maximum of update_image), any azimuth on demand (cross_section)
         self.hCoords = Grid(-2500, 2500, 0, 1000, self.grid, self.grid / 2)
         self.hGrid = self.hCoords.generate_grid()
-        self.hDisp = self.hCoords.generate_grid()
 
     def clear_grid(self, grid) -> None:
-        for row in grid:
-            for i in range(len(row)):
-                row[i] = 0
+        grid.fill(0)
 
     @staticmethod
     def grid_max(grid: np.ndarray):
-        rows = len(grid)
-        cols = len(grid[0]) if rows > 0 else 0
-        max_value = -1.0
-        
-        for y in range(rows):
-            for x in range(cols):
-                if grid[y][x] > max_value:
-                    max_value = grid[y][x]
-        
-        return max_value
-
-
-    def update_image(self):
-        # Extract maximum value from grids
-        grids_max = np.max(
-            [self.grid_max(self.rGrid), self.grid_max(self.hGrid)]
-        )
+        if grid.size == 0:
+            return -1.0
+        return max(float(np.max(grid)), -1.0)
+
+
+    def update_image(self, rgba: bool = True):
+        # Extract maximum value from the plan grid and the centreline slice
+        grids_max = max(self.grid_max(self.rGrid), self.grid_max(self.hGrid))
 
-        # Create PNG for plan and plume views
-        rImg = generate_png(np.array(self.rGrid), grids_max)
+        # Create PNG for plan view, or only its uint8 band indices
+        if not rgba:
+            return generate_bands(self.rGrid, grids_max)
+
+        rImg = generate_png(self.rGrid, grids_max)
         return rImg
 
+    def met_data(self) -> List[HourMET]:
+        # Generate random meteorological data
+        wdir_rad: float = self.wdir * math.pi / 180
+        return [HourMET(1, self.wspd, wdir_rad, self.pgcat)]
+
+    def nested_levels(self, source: Source) -> List[Grid]:
+        # Level k has step grid * 2^k and reaches nested_radius * 2^k around the source,
+        # so the step stays a fixed fraction of the distance to the source.
+        # Level k nodes are every 2^k-th node of rGrid (continued past xmax/ymin when the domain
+        # is not a whole number of steps); the last level covers the whole domain.
+        levels = []
+        step = self.grid
+        radius = self.nested_radius
+        while True:
+            last_col = math.ceil((self.xmax - self.xmin) / step)
+            last_row = math.ceil((self.ymax - self.ymin) / step)
+            left = min(max(math.floor((source.x - radius - self.xmin) / step), 0), last_col)
+            right = max(min(math.ceil((source.x + radius - self.xmin) / step), last_col), left)
+            top = min(max(math.floor((self.ymax - source.y - radius) / step), 0), last_row)
+            bottom = max(min(math.ceil((self.ymax - source.y + radius) / step), last_row), top)
+
+            levels.append(Grid(
+                self.xmin + step * left, self.xmin + step * right,
+                self.ymax - step * bottom, self.ymax - step * top,
+                step, step,
+            ))
+            if left == 0 and top == 0 and right == last_col and bottom == last_row:
+                return levels
+
+            step *= 2
+            radius *= 2
+
+    def level_offset(self, coords: Grid) -> Tuple[int, int]:
+        # (row, col) of the first node of a nested level among all nodes of its step
+        return int((self.ymax - coords.ymax) / coords.ygap), int((coords.xmin - self.xmin) / coords.xgap)
+
+    def disperse(self, batches) -> None:
+        # Add the concentrations of every batch of met lines to rGrid
+        if not self.adaptive:
+            for met in batches:
+                iter_disp(self, met, self.ambient_temp)
+                iter_centreline(self, met, self.ambient_temp)
+            return
+
+        sources = self.sources
+        stacks = [self.nested_levels(source) for source in sources]
+        if sum(coords.shape[0] * coords.shape[1] for levels in stacks for coords in levels) >= self.rGrid.size * len(sources):
+            # Область так мала, что вложенные уровни не экономят узлы
+            self.adaptive = False
+            try:
+                self.disperse(batches)
+            finally:
+                self.adaptive = True
+            return
+
+        # Every source is evaluated on its own nested levels. Level k contributes its difference from
+        # the interpolated level k + 1 (the coarsest level contributes its values), so the interpolated
+        # sum of the levels equals the finest level that covers a point. The contributions of all
+        # sources are accumulated per step in a pyramid; level 0 is rGrid itself.
+        depth = max(len(levels) for levels in stacks)
+        pyramid = [self.rGrid]
+        for index in range(1, depth):
+            step = self.grid * 2 ** index
+            grid = Grid(
+                self.xmin, self.xmin + step * math.ceil((self.xmax - self.xmin) / step),
+                self.ymax - step * math.ceil((self.ymax - self.ymin) / step), self.ymax,
+                step, step,
+            ).generate_grid(np.float64, self.grid_buffers, f"pyramid{index}")
+            self.clear_grid(grid)
+            pyramid.append(grid)
+
+        display = self.rCoords, self.rGrid
+        # Бэкенды считают на rCoords/rGrid по rsdm.sources, поэтому на время расчёта туда
+        # подставляются уровень и один источник
+        try:
+            for met in batches:
+                iter_centreline(self, met, self.ambient_temp)
+                for source, levels in zip(sources, stacks):
+                    self.sources = [source]
+                    grids = []
+                    for index, self.rCoords in enumerate(levels):
+                        # Окна источников у края области разного размера, поэтому они не хранятся в grid_buffers
+                        self.rGrid = self.rCoords.generate_grid(self.grid_dtype)
+                        iter_disp(self, met, self.ambient_temp)
+                        grids.append(self.rGrid)
+
+                    for index, (coords, grid) in enumerate(zip(levels, grids)):
+                        row, col = self.level_offset(coords)
+                        contribution = grid.astype(np.float64)
+                        if index + 1 < len(levels):
+                            coarse_row, coarse_col = self.level_offset(levels[index + 1])
+                            prolong_add(grids[index + 1], contribution, row - 2 * coarse_row, col - 2 * coarse_col, -1.0)
+
+                        target = pyramid[index][row:row + contribution.shape[0], col:col + contribution.shape[1]]
+                        target += contribution[:target.shape[0], :target.shape[1]]
+        finally:
+            self.rCoords, self.rGrid = display
+            self.sources = sources
+
+        # От грубого к точному: каждый шаг пирамиды получает интерполяцию более грубого
+        for index in range(depth - 1, 0, -1):
+            fine = pyramid[index - 1]
+            for start in range(0, fine.shape[0], PROLONG_ROWS):
+                prolong_add(pyramid[index], fine[start:start + PROLONG_ROWS], start)
+
+        # Разности уровней дают отрицательные значения порядка ошибки округления там, где факела нет
+        np.maximum(self.rGrid, 0, out=self.rGrid)
+
     def run_model(self):
         self.clear_grid(self.rGrid)
         self.clear_grid(self.hGrid)
 
-        # Generate random meteorological data
-        wdir_rad: float = self.wdir * math.pi / 180
-        met_data = [HourMET(1, self.wspd, wdir_rad, self.pgcat)]
-
         # Run dispersion model and update internal arrays
-        iter_disp(self, met_data, self.ambient_temp)
+        self.disperse([self.met_data()])
+
+        # Bound on the emitted mass fraction skipped outside the plume wedge
+        if self.backend != "python":
+            self.truncated_mass = wedge_truncation(self.sigma_cutoff)
+
+    def run_series(self, batches) -> int:
+        # Average over an hourly met series given as batches of
+        # (wind_speed, wind_direction, temperature, pgcat) records (see met_series.read_met_series).
+        # Every batch is accumulated into rGrid as it arrives, identical hours are computed once.
+        self.clear_grid(self.rGrid)
+        self.clear_grid(self.hGrid)
+
+        total = 0
+
+        def met_batches():
+            nonlocal total
+            for batch in batches:
+                counts = Counter(batch)
+                yield [
+                    HourMET(1 / count, wspd, wdir * math.pi / 180, pgcat, 273.15 + temp)
+                    for (wspd, wdir, temp, pgcat), count in counts.items()
+                ]
+                total += len(batch)
+
+        self.disperse(met_batches())
+
+        # Сумма по часам делится на их число только в конце
+        if total:
+            self.rGrid /= total
+            self.hGrid /= total
+
+        if self.backend != "python":
+            self.truncated_mass = wedge_truncation(self.sigma_cutoff)
+
+        return total
+
+    def point_concentrations(self, x, y, z: float = 0.0) -> np.ndarray:
+        # Concentration (g/m3) at receptor points from every source, shape (sources, points)
+        return iter_points(self, self.met_data(), self.ambient_temp, x, y, z)
+
+    def cross_section(self, azimuth: float) -> np.ndarray:
+        # Vertical slice through the stack along azimuth (degrees clockwise from north)
+        self.clear_grid(self.hGrid)
+        iter_slice(self, self.met_data(), self.ambient_temp, azimuth * math.pi / 180)
+        return self.hGrid
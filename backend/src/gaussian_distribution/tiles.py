@@ -0,0 +1,45 @@
+import io
+import numpy as np
+from PIL import Image
+
+from .process import GeoJSONGenerator
+
+TILE_SIZE = 256
+TILE_OPACITY = 153  # 0.6, как заливка полигонов на карте
+
+
+# Band index -> RGBA colour of the map layer: the group colour of the band,
+# band 0 (no concentration) is fully transparent.
+def tile_lut():
+    groups = GeoJSONGenerator.band_groups()
+    lut = np.zeros((len(groups), 4), dtype=np.uint8)
+
+    for band, group in enumerate(groups):
+        if group >= 0:
+            lut[band] = (*GeoJSONGenerator.get_color_by_area(group), TILE_OPACITY)
+
+    return lut
+
+tile_colours = tile_lut()
+
+
+# Latitude and longitude of the pixel centres of XYZ (Web Mercator) tile z/x/y
+def tile_lonlat(z, x, y):
+    n = 2 ** z
+    pixels = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+
+    lon = (x + pixels) / n * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + pixels) / n))))
+    return np.meshgrid(lon, lat)
+
+
+def render_tile(field, z, x, y):
+    rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+
+    if field is not None:
+        lon, lat = tile_lonlat(z, x, y)
+        rgba = tile_colours[field.sample(lat, lon)]
+
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buffer, format="PNG", optimize=False)
+    return buffer.getvalue()
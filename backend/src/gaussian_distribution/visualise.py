@@ -3,55 +3,70 @@ from PIL import Image
 import matplotlib.pyplot as plt
 import math
 
-def update_png(grid, disp, max_val, img_data):
-    rows, cols = grid.shape
-    
+bands = 10  # Количество логарифмических полос (декад) ниже максимума
+
+
+# Band index -> RGBA colour. Band 0 is left white (no concentration), higher
+# bands are darker shades of blue.
+def band_lut(bands):
+    lut = np.full((bands + 1, 4), 255, dtype=np.uint8)
+
+    for band in range(1, bands + 1):
+        conc = band / bands
+        lut[band, 0] = int(255 - 255 * conc)
+        lut[band, 1] = int(255 - 255 * conc)
+
+    return lut
+
+band_colours = band_lut(bands)
+
+
+def update_disp(grid, disp, max_val):
     # Calculate min based on max - use log to band
-    bands = 10  # Замените это значение на ваше реальное количество банд
     min_val = math.trunc(math.log10(max_val)) - bands
-   
-    # Normalise 2d grid into bands by taking log
-    for y in range(rows):
-        for x in range(cols):
-            if grid[y, x] > 0.0:
-                disp[y, x] = math.trunc(math.log10(grid[y, x]))
-            else:
-                disp[y, x] = min_val
 
+    # Normalise 2d grid into bands by taking log (math.trunc rounds towards zero, so does np.trunc).
+    # Intermediates keep the grid's dtype
+    positive = grid > 0.0
+    logs = np.log10(grid, out=np.zeros(grid.shape, dtype=grid.dtype), where=positive)
+    np.trunc(logs, out=logs)
+    logs[~positive] = min_val
+    disp[...] = logs
+    return min_val
+
+
+def update_png(grid, disp, max_val, img_data):
     # Construct an image of the given width and height
-    img_data = np.zeros((rows, cols, 4), dtype=np.uint8)  # RGBA format
-
-    for y in range(rows):
-        for x in range(cols):
-            # Default pixel set to white
-            pixelR = 255
-            pixelG = 255
-            pixelB = 255
-            
-            # Set shade of blue if concentration meets criteria
-            if disp[y, x] > min_val:
-                conc = (disp[y, x] - min_val) / bands
-                pixelR = int(255 - 255 * conc)
-                pixelG = int(255 - 255 * conc)
-                pixelB = 255
-
-            img_data[y, x] = [pixelR, pixelG, pixelB, 255]  # Alpha channel set to 255 (opaque)
+    return band_colours[generate_bands(grid, max_val, disp)]  # RGBA format
+
+
+# Band index of every cell: 0 where the concentration is at or below the lowest band,
+# 1..bands otherwise.
+def generate_bands(grid, max_val, disp=None):
+    if max_val <= 0:
+        return np.zeros(grid.shape, dtype=np.uint8)
+
+    if disp is None:
+        disp = np.zeros(grid.shape, dtype=np.int16)
+
+    min_val = update_disp(grid, disp, max_val)
+    disp -= min_val
+    np.clip(disp, 0, bands, out=disp)
+    return disp.astype(np.uint8)
 
-    return img_data
 
 def generate_png(grid, max_val):
     # Calculate grid dimensions
     rows, cols = grid.shape
 
     # Create an empty image data array
-    disp = np.zeros((rows, cols), dtype=int)
+    disp = np.zeros((rows, cols), dtype=np.int16)
 
     # Update imgData array inplace with rendered image
     img_data = update_png(grid, disp, max_val, None)
-    
+
     return img_data
 
 def export_png(data, target_id):
     # В данном контексте функция может быть использована для отображения изображения в веб-приложении.
     print(f"Image data for {target_id}: {data}")
-
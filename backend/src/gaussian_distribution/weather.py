@@ -0,0 +1,131 @@
+import abc
+import json
+import time
+import asyncio
+from pathlib import Path
+
+import httpx
+from loguru import logger
+
+from .. import config as cfg
+
+# Погода при недоступном источнике: штиль, расчёт факела пропускается
+fallback_weather = {
+    'temperature': 0,
+    'temperature_min': 0,
+    'temperature_max': 0,
+    'humidity': 70,
+    'wind_direction': 0,
+    'wind_speed': 0,
+    'clouds': 0,
+    'weather_conditions': []
+}
+
+
+def parse_weather(weather_data):
+    # Ответ OpenWeatherMap (units=metric) -> данные для WeatherChecker
+    return {
+        'temperature': weather_data['main']['temp'],
+        'temperature_min': weather_data['main']['temp_min'] + 273.15,
+        'temperature_max': weather_data['main']['temp_max'] + 273.15,
+        'humidity': weather_data['main']['humidity'],
+        'wind_direction': weather_data['wind']['deg'],
+        'wind_speed': weather_data['wind']['speed'],
+        'clouds': weather_data['clouds']['all'],
+        'weather_conditions': [w['main'] for w in weather_data['weather']]
+    }
+
+
+# Base class of the weather providers: fetch() returns the parsed weather, reusing the
+# last result for ttl seconds. When the upstream fails, the last good result is kept,
+# and fallback_weather is used only if there has never been one.
+class WeatherProvider(abc.ABC):
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+        self.weather_data = None
+        self.fetched_at = None
+        self.lock = asyncio.Lock()
+
+    @abc.abstractmethod
+    async def fetch_raw(self):
+        # -> ответ OpenWeatherMap (dict), см. parse_weather
+        ...
+
+    async def fetch(self):
+        async with self.lock:
+            if self.fetched_at is not None and time.monotonic() - self.fetched_at < self.ttl:
+                return self.weather_data
+
+            try:
+                self.weather_data = parse_weather(await self.fetch_raw())
+                self.fetched_at = time.monotonic()
+            except (httpx.HTTPError, OSError, ValueError, KeyError, TypeError) as e:
+                if self.weather_data is None:
+                    logger.warning(f"Weather unavailable, using calm fallback: {e!r}")
+                    return dict(fallback_weather)
+                logger.warning(f"Weather unavailable, reusing the previous result: {e!r}")
+
+            return self.weather_data
+
+    async def aclose(self):
+        pass
+
+
+class OpenWeatherMapProvider(WeatherProvider):
+    def __init__(self, url=None, timeout: float = 10, ttl: float = 600, record_path=None):
+        super().__init__(ttl)
+        self.url = url or cfg.API_OPENWEATHERMAP_URL
+        # Пул соединений переиспользуется между запросами
+        self.client = httpx.AsyncClient(timeout=timeout, limits=httpx.Limits(max_connections=4))
+        # Ответы можно записывать в JSON Lines для последующего воспроизведения (ReplayProvider)
+        self.record_path = record_path
+
+    async def fetch_raw(self):
+        response = await self.client.get(self.url)
+        response.raise_for_status()
+        weather_data = response.json()
+
+        if self.record_path is not None:
+            # Запись на диск не блокирует цикл событий
+            await asyncio.to_thread(self.record, weather_data)
+
+        return weather_data
+
+    def record(self, weather_data):
+        with open(self.record_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(weather_data, ensure_ascii=False) + "\n")
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# Replays recorded OpenWeatherMap responses (JSON Lines, one per line) in a loop,
+# so the pipeline runs without network access.
+class ReplayProvider(WeatherProvider):
+    def __init__(self, path, ttl: float = 0):
+        super().__init__(ttl)
+        with open(Path(path), "r", encoding="utf-8") as f:
+            self.records = [json.loads(line) for line in f if line.strip()]
+
+        if not self.records:
+            raise ValueError(f"No weather records in {path}")
+        self.position = 0
+
+    async def fetch_raw(self):
+        weather_data = self.records[self.position]
+        self.position = (self.position + 1) % len(self.records)
+        return weather_data
+
+
+weather_providers = {
+    "openweathermap": lambda: OpenWeatherMapProvider(
+        timeout=cfg.WEATHER_TIMEOUT, ttl=cfg.WEATHER_TTL, record_path=cfg.WEATHER_RECORD_PATH
+    ),
+    "replay": lambda: ReplayProvider(cfg.WEATHER_REPLAY_PATH),
+}
+
+
+def make_provider(name):
+    if name not in weather_providers:
+        raise ValueError(f"Unknown weather provider: {name!r}")
+    return weather_providers[name]()
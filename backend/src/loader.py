@@ -1,15 +1,22 @@
+import copy
 import json
 from fastapi import FastAPI
-from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from starlette.middleware.cors import CORSMiddleware
 from src.gaussian_distribution.process import GeoJSONApp
+from src.gaussian_distribution.result_cache import ResultCache
+from src.gaussian_distribution.weather import make_provider
+from src.api.payloads import publish
+from src.api.spatial import indexes, points_index
+from src.api.model import prepare_collections, prepare_model, publish_model
+from src.api.metrics import MetricsMiddleware
 
 from . import config as cfg
 
-executor = ThreadPoolExecutor(max_workers=1)
 app: FastAPI = FastAPI(debug=True)
-gd: GeoJSONApp = GeoJSONApp(cfg.BACKEND_SRC_ROOT / "data" / "factory.json")
 
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -18,8 +25,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-with open(cfg.GEOJSON_PATH, "r") as f:
-    cfg.GEOJSON_DATA = json.load(f) 
+# Объекты процесса API создаются при запуске сервера (startup), а не при импорте модуля:
+# процессы расчёта (spawn) заново импортируют главный модуль и не должны их повторять
+executor: ThreadPoolExecutor = None
+process_pool: ProcessPoolExecutor = None
+gd: GeoJSONApp = None
+weather_provider = None
 
-with open(cfg.FACTORIES_PATH, "r", encoding="utf-8") as f:
-    cfg.FACTORIES = json.load(f)
+
+def startup():
+    global executor, process_pool, gd, weather_provider
+
+    # Поток планирует запуски модели, сам расчёт выполняется в пуле процессов
+    executor = ThreadPoolExecutor(max_workers=1)
+    process_pool = ProcessPoolExecutor(
+        max_workers=cfg.MODEL_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) if cfg.MODEL_WORKERS > 0 else None
+    gd = GeoJSONApp(
+        cfg.BACKEND_SRC_ROOT / "data" / "factory.json",
+        mode=cfg.MODEL_MODE,
+        result_cache=ResultCache(cfg.RESULT_CACHE_DIR, cfg.RESULT_CACHE_SIZE),
+        pool=process_pool,
+        met_series=cfg.MET_SERIES_PATH,
+        prepare=prepare_model,
+    )
+    weather_provider = make_provider(cfg.WEATHER_PROVIDER)
+
+    # До первого запуска модели публикуется geojson прошлого запуска
+    with open(cfg.GEOJSON_PATH, "r", encoding="utf-8") as f:
+        cfg.MODEL_RELEASE = {"geojson": prepare_collections(json.load(f))}
+
+    with open(cfg.FACTORIES_PATH, "r", encoding="utf-8") as f:
+        cfg.FACTORIES = json.load(f)
+
+    # Ответы API сериализуются один раз; geojson публикуется заново после каждого запуска модели
+    factories = copy.deepcopy(cfg.FACTORIES)
+    for factory in factories["features"]:
+        factory["geometry"]["coordinates"].reverse()
+
+    publish("factories", factories)
+    publish("sensors", dict(marks=cfg.SENSORS))
+
+    # Предприятия и датчики не меняются, их индексы для запросов по bbox строятся один раз
+    factory_lons, factory_lats = zip(*(factory["geometry"]["coordinates"] for factory in cfg.FACTORIES["features"]))
+    indexes["factories"] = points_index(factory_lons, factory_lats, factories["features"])
+    indexes["sensors"] = points_index([lon for _, lon in cfg.SENSORS], [lat for lat, _ in cfg.SENSORS], cfg.SENSORS)
+    publish_model()
+
+
+async def shutdown():
+    await weather_provider.aclose()
+    executor.shutdown(wait=False, cancel_futures=True)
+    if process_pool is not None:
+        process_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,128 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Minimal Prometheus-compatible registry (text exposition format 0.0.4).
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labels = tuple(labels)
+        self.series = {}  # значения меток -> [счётчики по корзинам, сумма, количество]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.series.items()):
+                labels = dict(zip(self.labels, key))
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': f'{bound:g}'})} {bucket_count}")
+                lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': '+Inf'})} {count}")
+                lines.append(f"{self.name}_sum{format_labels(labels)} {total:.6g}")
+                lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.series[tuple(str(labels[name]) for name in self.labels)] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self.lock:
+            for key, value in sorted(self.series.items()):
+                lines.append(f"{self.name}{format_labels(dict(zip(self.labels, key)))} {value:.6g}")
+        return lines
+
+
+stage_seconds = Histogram(
+    "emissioneye_stage_seconds", "Duration of model cycle stages",
+    (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600), labels=("stage",),
+)
+stage_last_seconds = Gauge(
+    "emissioneye_stage_last_seconds", "Duration of the latest run of each model cycle stage", labels=("stage",),
+)
+request_seconds = Histogram(
+    "emissioneye_request_seconds", "API request latency",
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10), labels=("method", "route", "status"),
+)
+response_bytes = Histogram(
+    "emissioneye_response_bytes", "API response body size",
+    (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216), labels=("method", "route"),
+)
+
+registry = [stage_seconds, stage_last_seconds, request_seconds, response_bytes]
+
+
+def render():
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+# Списки, в которые дополнительно пишутся стадии (см. recording)
+recorders = []
+
+
+def observe_stage(name, seconds):
+    stage_seconds.observe(seconds, stage=name)
+    stage_last_seconds.set(seconds, stage=name)
+    for recorder in recorders:
+        recorder.append((name, seconds))
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+@contextmanager
+def recording():
+    # Собирает (стадия, секунды) внутри блока: для сводки цикла и передачи из процесса расчёта
+    stages = []
+    recorders.append(stages)
+    try:
+        yield stages
+    finally:
+        recorders.remove(stages)
+
+
+def summarize(stages):
+    totals = {}
+    for name, seconds in stages:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in totals.items())
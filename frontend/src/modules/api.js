@@ -11,26 +11,59 @@ api.interceptors.response.use(
 	}
 );
 
-export async function getSensors() {
-	return api.post("/api/get_sensors")
+// Область карты [minLon, minLat, maxLon, maxLat]: сервер вернёт только объекты внутри неё
+function bboxParams(bbox) {
+	return bbox ? { bbox: bbox.join(",") } : {}
+}
+
+export async function getSensors(bbox = null) {
+	return api.get("/api/get_sensors", { params: bboxParams(bbox) })
+		.then(response => {
+			return response.data
+		})
+		.catch(e => { return null })
+}
+
+export async function getFactories(bbox = null) {
+	return api.get("/api/get_factories", { params: bboxParams(bbox) })
+		.then(response => {
+			return response.data
+		})
+		.catch(e => { return null })
+}
+
+// zoom - масштаб карты: на мелких масштабах сервер отдаёт упрощённые полигоны
+export async function getGeoJson(bbox = null, zoom = null) {
+	const params = bboxParams(bbox)
+	if (zoom !== null) {
+		params.zoom = Math.round(zoom)
+	}
+	return api.get("/api/get_geojson", { params })
 		.then(response => {
-			return JSON.parse(response.data)
+			return response.data
 		})
 		.catch(e => { return null })
 }
 
-export async function getFactories() {
-	return api.post("/api/get_factories")
+export async function getModel() {
+	return api.get("/api/get_model")
 		.then(response => {
-			return JSON.parse(response.data)
+			return response.data
 		})
 		.catch(e => { return null })
 }
 
-export async function getGeoJson() {
-	return api.post("/api/get_geojson")
+export async function getSensorConcentrations(points = null) {
+	return (points ? api.post("/api/get_sensor_concentrations", { points }) : api.get("/api/get_sensor_concentrations"))
 		.then(response => {
-			return JSON.parse(response.data)
+			return response.data
 		})
 		.catch(e => { return null })
-}
\ No newline at end of file
+}
+
+// Подписка на объявления о новых результатах модели (Server-Sent Events)
+export function subscribeModel(onModel) {
+	const events = new EventSource("/api/events")
+	events.addEventListener("model", event => onModel(JSON.parse(event.data)))
+	return () => events.close()
+}